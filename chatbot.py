@@ -1,312 +1,1390 @@
-import random
-import re
-from datetime import datetime, timedelta
-from typing import List, Dict, Tuple
-import json
-
-class EnhancedRuleBot:
-    def __init__(self):
-        """Initialize the chatbot with conversation history and personality."""
-        self.conversation_history = []
-        self.user_name = None
-        self.user_preferences = {}
-        self.session_start_time = datetime.now()
-        
-        # Response templates for more variety
-        self.greeting_responses = [
-            "Hello! How can I help you today?",
-            "Hi there! What's on your mind?",
-            "Hey! Great to see you! How can I assist?",
-            "Hello! I'm here to help. What would you like to know?",
-            "Hi! Ready to chat? What can I do for you?"
-        ]
-        
-        self.goodbye_responses = [
-            "Goodbye! Have a great day!",
-            "See you later! Take care!",
-            "Farewell! It was nice chatting with you!",
-            "Bye! Hope to talk again soon!",
-            "Take care! Have a wonderful day!"
-        ]
-        
-        self.thanks_responses = [
-            "You're welcome!",
-            "Happy to help!",
-            "No problem at all!",
-            "Glad I could assist!",
-            "Anytime! "
-        ]
-        
-        # Knowledge base for different topics
-        self.knowledge_base = {
-            'weather': {
-                'keywords': ['weather', 'temperature', 'rain', 'sunny', 'cloudy'],
-                'responses': [
-                    "I can't check real weather, but I hope it's nice where you are!",
-                    "Sorry, I don't have access to weather data. Try a weather app!",
-                    "I wish I could tell you the weather! Maybe check your local forecast?"
-                ]
-            },
-            'jokes': {
-                'keywords': ['joke', 'funny', 'laugh', 'humor'],
-                'responses': [
-                    "Why don't scientists trust atoms? Because they make up everything!",
-                    "I told my wife she was drawing her eyebrows too high. She looked surprised!",
-                    "Why did the scarecrow win an award? He was outstanding in his field!",
-                    "I'm reading a book about anti-gravity. It's impossible to put down!",
-                    "Why don't eggs tell jokes? They'd crack each other up!"
-                ]
-            },
-            'facts': {
-                'keywords': ['fact', 'interesting', 'tell me something', 'learn'],
-                'responses': [
-                    "Did you know that octopuses have three hearts?",
-                    "Fun fact: Honey never spoils! Archaeologists have found edible honey in ancient Egyptian tombs.",
-                    "A group of flamingos is called a 'flamboyance'!",
-                    "Bananas are berries, but strawberries aren't!",
-                    "The human brain uses about 20% of the body's total energy."
-                ]
-            },
-            'programming': {
-                'keywords': ['code', 'programming', 'python', 'developer', 'coding'],
-                'responses': [
-                    "Programming is awesome! Are you learning any specific language?",
-                    "Code is poetry in motion! What kind of projects are you working on?",
-                    "Python is a great language to start with! Keep practicing!",
-                    "Every expert was once a beginner. Keep coding!",
-                    "Debugging is like being a detective in a crime movie where you're also the murderer!"
-                ]
-            }
-        }
-    
-    def log_interaction(self, user_input: str, bot_response: str) -> None:
-        """Log the conversation for context awareness."""
-        timestamp = datetime.now().strftime("%H:%M:%S")
-        self.conversation_history.append({
-            'timestamp': timestamp,
-            'user': user_input,
-            'bot': bot_response
-        })
-    
-    def extract_name_from_input(self, user_input: str) -> str:
-        """Try to extract user's name from their input."""
-        patterns = [
-            r"my name is (\w+)",
-            r"i'm (\w+)",
-            r"i am (\w+)",
-            r"call me (\w+)"
-        ]
-        
-        for pattern in patterns:
-            match = re.search(pattern, user_input.lower())
-            if match:
-                return match.group(1).title()
-        return None
-    
-    def get_sentiment_response(self, user_input: str) -> str:
-        """Provide empathetic responses based on user sentiment."""
-        positive_words = ['happy', 'great', 'awesome', 'good', 'excellent', 'wonderful', 'amazing']
-        negative_words = ['sad', 'bad', 'terrible', 'awful', 'horrible', 'upset', 'angry']
-        
-        if any(word in user_input.lower() for word in positive_words):
-            return "That's wonderful to hear! I'm glad you're feeling positive! "
-        elif any(word in user_input.lower() for word in negative_words):
-            return "I'm sorry to hear that. I hope things get better for you soon. "
-        
-        return None
-    
-    def calculate_simple_math(self, user_input: str) -> str:
-        """Handle simple mathematical calculations."""
-        # Look for basic math patterns
-        math_pattern = r'(\d+)\s*([+\-*/])\s*(\d+)'
-        match = re.search(math_pattern, user_input)
-        
-        if match:
-            num1, operator, num2 = match.groups()
-            num1, num2 = int(num1), int(num2)
-            
-            try:
-                if operator == '+':
-                    result = num1 + num2
-                elif operator == '-':
-                    result = num1 - num2
-                elif operator == '*':
-                    result = num1 * num2
-                elif operator == '/':
-                    if num2 != 0:
-                        result = num1 / num2
-                    else:
-                        return "Oops! Can't divide by zero!"
-                
-                return f"{num1} {operator} {num2} = {result}"
-            except:
-                return "I had trouble with that calculation. Could you try again?"
-        
-        return None
-    
-    def get_topic_response(self, user_input: str) -> str:
-        """Get response based on topic detection."""
-        for topic, data in self.knowledge_base.items():
-            if any(keyword in user_input.lower() for keyword in data['keywords']):
-                return random.choice(data['responses'])
-        return None
-    
-    def chatbot_response(self, user_input: str) -> str:
-        """Main response generation method with enhanced logic."""
-        user_input_clean = user_input.lower().strip()
-        
-        # Handle empty input
-        if not user_input_clean:
-            return "I didn't catch that. Could you say something?"
-        
-        # Extract name if mentioned
-        name = self.extract_name_from_input(user_input)
-        if name:
-            self.user_name = name
-            return f"Nice to meet you, {name}! I'll remember your name."
-        
-        # Greeting responses
-        greetings = ['hi', 'hello', 'hey', 'good morning', 'good afternoon', 'good evening']
-        if any(greet in user_input_clean for greet in greetings):
-            response = random.choice(self.greeting_responses)
-            if self.user_name:
-                response = response.replace("Hello!", f"Hello {self.user_name}!")
-            return response
-        
-        # Bot identity questions
-        if any(phrase in user_input_clean for phrase in ["your name", "who are you", "what are you"]):
-            return "I am RuleBot, your friendly AI assistant! I love to chat and help out however I can."
-        
-        # Capabilities question
-        if any(phrase in user_input_clean for phrase in ["what can you do", "help me", "what do you do"]):
-            capabilities = [
-                " Have friendly conversations",
-                " Tell you the current time",
-                " Do simple math calculations",
-                " Share jokes and fun facts",
-                " Remember your name during our chat",
-                " Respond to your mood and questions"
-            ]
-            return "Here's what I can do:\n" + "\n".join(capabilities)
-        
-        # Time-related requests
-        if "time" in user_input_clean:
-            current_time = datetime.now().strftime("%H:%M:%S")
-            session_duration = datetime.now() - self.session_start_time
-            return f"Current time is {current_time}. We've been chatting for {str(session_duration).split('.')[0]}!"
-        
-        # Date requests
-        if "date" in user_input_clean or "today" in user_input_clean:
-            current_date = datetime.now().strftime("%B %d, %Y")
-            day_name = datetime.now().strftime("%A")
-            return f"Today is {day_name}, {current_date}."
-        
-        # Math calculations
-        math_result = self.calculate_simple_math(user_input)
-        if math_result:
-            return f"Let me calculate that: {math_result}"
-        
-        # Sentiment-based responses
-        sentiment_response = self.get_sentiment_response(user_input)
-        if sentiment_response:
-            return sentiment_response
-        
-        # Topic-based responses
-        topic_response = self.get_topic_response(user_input)
-        if topic_response:
-            return topic_response
-        
-        # Conversation history reference
-        if "remember" in user_input_clean and len(self.conversation_history) > 1:
-            return f"I remember we were talking about {len(self.conversation_history)} things so far!"
-        
-        # Thanks handling
-        if any(thanks in user_input_clean for thanks in ['thank you', 'thanks', 'thx', 'appreciate']):
-            response = random.choice(self.thanks_responses)
-            if self.user_name:
-                response += f" Happy to help you, {self.user_name}!"
-            return response
-        
-        # Goodbye handling
-        if any(bye in user_input_clean for bye in ['bye', 'goodbye', 'see you', 'farewell', 'exit']):
-            response = random.choice(self.goodbye_responses)
-            if self.user_name:
-                response = response.replace("Goodbye!", f"Goodbye {self.user_name}!")
-            return response
-        
-        # Age question
-        if "how old" in user_input_clean or "your age" in user_input_clean:
-            return "I'm as old as our conversation! I was created just for you today. "
-        
-        # Location question
-        if "where are you" in user_input_clean or "your location" in user_input_clean:
-            return "I exist in the digital realm! I'm here wherever you are chatting with me. "
-        
-        # Default responses with more variety
-        default_responses = [
-            "That's interesting! Could you tell me more about it?",
-            "I'm not sure I understand completely. Could you rephrase that?",
-            "Hmm, that's a new one for me! What would you like to know?",
-            "I'd love to help, but I need a bit more context. Can you elaborate?",
-            "That sounds intriguing! Want to chat about something else I might know better?",
-        ]
-        
-        return random.choice(default_responses)
-    
-    def get_conversation_summary(self) -> str:
-        """Provide a summary of the conversation."""
-        total_interactions = len(self.conversation_history)
-        session_duration = datetime.now() - self.session_start_time
-        
-        summary = f"""
-Conversation Summary:
-• Total exchanges: {total_interactions}
-• Session duration: {str(session_duration).split('.')[0]}
-• Your name: {self.user_name if self.user_name else 'Not shared'}
-• Started: {self.session_start_time.strftime('%H:%M:%S')}
-        """
-        return summary.strip()
-
-def main():
-    """Main function to run the enhanced chatbot."""
-    bot = EnhancedRuleBot()
-    
-    print("=" * 60)
-    print(" Welcome to Enhanced RuleBot! ")
-    print("=" * 60)
-    print("I'm your friendly AI assistant!")
-    print("Type 'exit', 'quit', or 'bye' to end our conversation.")
-    print("Type 'summary' to see our conversation stats.")
-    print("-" * 60)
-    
-    while True:
-        try:
-            user_input = input("\n  You: ").strip()
-            
-            # Check for exit conditions
-            if user_input.lower() in ['exit', 'quit']:
-                print(f"\n RuleBot: {random.choice(bot.goodbye_responses)}")
-                print(bot.get_conversation_summary())
-                break
-            
-            # Special command for conversation summary
-            if user_input.lower() == 'summary':
-                print(f"\n RuleBot: {bot.get_conversation_summary()}")
-                continue
-            
-            # Get bot response
-            response = bot.chatbot_response(user_input)
-            print(f" RuleBot: {response}")
-            
-            # Log the interaction
-            bot.log_interaction(user_input, response)
-            
-        except KeyboardInterrupt:
-            print(f"\n\n🤖 RuleBot: Looks like you used Ctrl+C! {random.choice(bot.goodbye_responses)}")
-            print(bot.get_conversation_summary())
-            break
-        except Exception as e:
-            print(f" RuleBot: Oops! Something went wrong. Let's keep chatting though! ")
-
-if __name__ == "__main__":
+import argparse
+import asyncio
+import random
+import re
+import time
+import uuid
+from collections import OrderedDict, deque
+from datetime import datetime, timedelta
+from functools import lru_cache
+from typing import Iterator, List, Dict, NamedTuple, Optional, Tuple, Union
+import json
+import os
+import sqlite3
+import threading
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from types import MappingProxyType
+
+try:
+    import yaml
+except ImportError:  # YAML knowledge files need PyYAML
+    yaml = None
+
+# Intent keywords, matched as lowercase substrings. chatbot_response
+# checks intents in its own fixed order, not the order listed here.
+INTENT_KEYWORDS = {
+    'name': ["my name is ", "i'm ", "i am ", "call me "],
+    'greeting': ['hi', 'hello', 'hey', 'good morning', 'good afternoon', 'good evening'],
+    'identity': ["your name", "who are you", "what are you"],
+    'capabilities': ["what can you do", "help me", "what do you do"],
+    'time': ["time"],
+    'date': ["date", "today"],
+    'positive': ['happy', 'great', 'awesome', 'good', 'excellent', 'wonderful', 'amazing'],
+    'negative': ['sad', 'bad', 'terrible', 'awful', 'horrible', 'upset', 'angry'],
+    'remember': ["remember"],
+    'thanks': ['thank you', 'thanks', 'thx', 'appreciate'],
+    'goodbye': ['bye', 'goodbye', 'see you', 'farewell', 'exit'],
+    'age': ["how old", "your age"],
+    'location': ["where are you", "your location"]
+}
+
+# Built-in response templates and topics, used when no knowledge file is given
+DEFAULT_RESPONSES = {
+    'greeting': [
+        "Hello! How can I help you today?",
+        "Hi there! What's on your mind?",
+        "Hey! Great to see you! How can I assist?",
+        "Hello! I'm here to help. What would you like to know?",
+        "Hi! Ready to chat? What can I do for you?"
+    ],
+    'goodbye': [
+        "Goodbye! Have a great day!",
+        "See you later! Take care!",
+        "Farewell! It was nice chatting with you!",
+        "Bye! Hope to talk again soon!",
+        "Take care! Have a wonderful day!"
+    ],
+    'thanks': [
+        "You're welcome!",
+        "Happy to help!",
+        "No problem at all!",
+        "Glad I could assist!",
+        "Anytime! "
+    ]
+}
+
+DEFAULT_TOPICS = {
+    'weather': {
+        'keywords': ['weather', 'temperature', 'rain', 'sunny', 'cloudy'],
+        'responses': [
+            "I can't check real weather, but I hope it's nice where you are!",
+            "Sorry, I don't have access to weather data. Try a weather app!",
+            "I wish I could tell you the weather! Maybe check your local forecast?"
+        ]
+    },
+    'jokes': {
+        'keywords': ['joke', 'funny', 'laugh', 'humor'],
+        'responses': [
+            "Why don't scientists trust atoms? Because they make up everything!",
+            "I told my wife she was drawing her eyebrows too high. She looked surprised!",
+            "Why did the scarecrow win an award? He was outstanding in his field!",
+            "I'm reading a book about anti-gravity. It's impossible to put down!",
+            "Why don't eggs tell jokes? They'd crack each other up!"
+        ]
+    },
+    'facts': {
+        'keywords': ['fact', 'interesting', 'tell me something', 'learn'],
+        'responses': [
+            "Did you know that octopuses have three hearts?",
+            "Fun fact: Honey never spoils! Archaeologists have found edible honey in ancient Egyptian tombs.",
+            "A group of flamingos is called a 'flamboyance'!",
+            "Bananas are berries, but strawberries aren't!",
+            "The human brain uses about 20% of the body's total energy."
+        ]
+    },
+    'programming': {
+        'keywords': ['code', 'programming', 'python', 'developer', 'coding'],
+        'responses': [
+            "Programming is awesome! Are you learning any specific language?",
+            "Code is poetry in motion! What kind of projects are you working on?",
+            "Python is a great language to start with! Keep practicing!",
+            "Every expert was once a beginner. Keep coding!",
+            "Debugging is like being a detective in a crime movie where you're also the murderer!"
+        ]
+    }
+}
+
+# Limits for calculate_simple_math: longer, deeper or larger inputs are
+# refused before any work proportional to them is done
+MAX_EXPRESSION_LENGTH = 200
+MAX_EXPRESSION_TOKENS = 100
+MAX_EXPRESSION_DEPTH = 32
+MAX_EXPONENT = 1000
+MAX_RESULT_BITS = 3322  # about 1000 decimal digits
+
+# Candidate expressions in free text: operands (numbers with signs and
+# parentheses) joined by operators; numbers separated only by spaces are
+# separate candidates. A candidate never starts inside a run of signs,
+# spaces or open parentheses (the run's first character already tried
+# it), which keeps scanning long runs linear rather than quadratic.
+_OPERAND = r"[-+(\s]*(?:\d+(?:\.\d*)?|\.\d+)(?:\s*\))*"
+EXPRESSION_PATTERN = re.compile(rf"(?<![-+(\s]){_OPERAND}(?:\s*(?:\*\*|[-+*/%^]){_OPERAND})*")
+TOKEN_PATTERN = re.compile(r"\s*(?:(\d+\.\d*|\.\d+|\d+)|(\*\*|[-+*/%^()]))")
+
+# Binding strength of each node kind, for parsing and for printing
+PRECEDENCE = {'+': 1, '-': 1, '*': 2, '/': 2, '%': 2, 'neg': 3, 'pos': 3, '**': 4, 'num': 5}
+
+class ExpressionError(ValueError):
+    """An expression the evaluator cannot parse or compute."""
+
+class ExpressionLimitError(ExpressionError):
+    """An expression over one of the evaluator's size limits."""
+
+def tokenize_expression(text: str) -> List[str]:
+    """Split an arithmetic expression into number and operator tokens."""
+    if len(text) > MAX_EXPRESSION_LENGTH:
+        raise ExpressionLimitError("expression too long")
+    tokens = []
+    position = 0
+    text = text.rstrip()
+    while position < len(text):
+        match = TOKEN_PATTERN.match(text, position)
+        if not match:
+            raise ExpressionError(f"unexpected character {text[position]!r}")
+        tokens.append('**' if match.group(2) == '^' else match.group(1) or match.group(2))
+        position = match.end()
+        if len(tokens) > MAX_EXPRESSION_TOKENS:
+            raise ExpressionLimitError("too many tokens")
+    return tokens
+
+@lru_cache(maxsize=4096)
+def parse_expression(text: str) -> Tuple:
+    """Parse text into a nested-tuple AST by precedence climbing."""
+    tokens = tokenize_expression(text)
+    position = 0
+    depth = 0
+    
+    def peek() -> Optional[str]:
+        return tokens[position] if position < len(tokens) else None
+    
+    def take() -> str:
+        nonlocal position
+        if position >= len(tokens):
+            raise ExpressionError("unexpected end of expression")
+        position += 1
+        return tokens[position - 1]
+    
+    def binary(min_precedence: int) -> Tuple:
+        # + - (1) and * / % (2), all left associative
+        left = unary()
+        while peek() in ('+', '-', '*', '/', '%') and PRECEDENCE[peek()] >= min_precedence:
+            operator = take()
+            left = (operator, left, binary(PRECEDENCE[operator] + 1))
+        return left
+    
+    def unary() -> Tuple:
+        # Unary signs bind looser than ** on their right: -2 ** 2 == -4
+        nonlocal depth
+        if peek() in ('-', '+'):
+            depth += 1
+            if depth > MAX_EXPRESSION_DEPTH:
+                raise ExpressionLimitError("expression nested too deeply")
+            node = ('neg' if take() == '-' else 'pos', unary())
+            depth -= 1
+            return node
+        return power()
+    
+    def power() -> Tuple:
+        # ** is right associative and may take a signed exponent: 2 ** -1
+        base = atom()
+        if peek() == '**':
+            take()
+            return ('**', base, unary())
+        return base
+    
+    def atom() -> Tuple:
+        nonlocal depth
+        token = take()
+        if token == '(':
+            depth += 1
+            if depth > MAX_EXPRESSION_DEPTH:
+                raise ExpressionLimitError("expression nested too deeply")
+            node = binary(1)
+            if take() != ')':
+                raise ExpressionError("missing ')'")
+            depth -= 1
+            return node
+        if token[0].isdigit() or token[0] == '.':
+            if len(token) > MAX_RESULT_BITS // 3:
+                raise ExpressionLimitError("number too long")
+            if '.' in token:
+                return ('num', float(token), token)
+            return ('num', int(token), str(int(token)))
+        raise ExpressionError(f"unexpected {token!r}")
+    
+    node = binary(1)
+    if position != len(tokens):
+        raise ExpressionError(f"unexpected {tokens[position]!r}")
+    return node
+
+def _check_result(value: Union[int, float]) -> Union[int, float]:
+    if isinstance(value, complex):
+        raise ExpressionError("complex result")
+    if isinstance(value, int):
+        if value.bit_length() > MAX_RESULT_BITS:
+            raise ExpressionLimitError("result too large")
+    elif value != value or value in (float('inf'), float('-inf')):
+        raise ExpressionLimitError("result out of range")
+    return value
+
+def _evaluate(node: Tuple) -> Union[int, float]:
+    kind = node[0]
+    if kind == 'num':
+        return node[1]
+    if kind == 'neg':
+        return -_evaluate(node[1])
+    if kind == 'pos':
+        return _evaluate(node[1])
+    
+    left, right = _evaluate(node[1]), _evaluate(node[2])
+    if kind == '+':
+        result = left + right
+    elif kind == '-':
+        result = left - right
+    elif kind == '*':
+        result = left * right
+    elif kind == '/':
+        result = left / right
+    elif kind == '%':
+        result = left % right
+    else:
+        # Refuse huge powers before computing them
+        if abs(right) > MAX_EXPONENT and abs(left) not in (0, 1):
+            raise ExpressionLimitError("exponent too large")
+        if isinstance(left, int) and isinstance(right, int) and right > 0 \
+                and abs(left).bit_length() * right > MAX_RESULT_BITS + right:
+            raise ExpressionLimitError("result too large")
+        result = left ** right
+    return _check_result(result)
+
+@lru_cache(maxsize=4096)
+def evaluate_expression(text: str) -> Union[int, float]:
+    """Evaluate an arithmetic expression safely; raises ExpressionError or ZeroDivisionError."""
+    try:
+        return _evaluate(parse_expression(text))
+    except OverflowError:
+        raise ExpressionLimitError("result out of range")
+
+def format_expression(node: Tuple) -> str:
+    """Render an AST with single spaces and only the parentheses it needs."""
+    kind = node[0]
+    if kind == 'num':
+        return node[2]
+    if kind in ('neg', 'pos'):
+        operand = format_expression(node[1])
+        if PRECEDENCE[node[1][0]] < PRECEDENCE[kind]:
+            operand = f"({operand})"
+        return ('-' if kind == 'neg' else '+') + operand
+    
+    left, right = format_expression(node[1]), format_expression(node[2])
+    precedence = PRECEDENCE[kind]
+    # ** groups to the right, everything else to the left
+    if PRECEDENCE[node[1][0]] < precedence or (kind == '**' and PRECEDENCE[node[1][0]] == precedence):
+        left = f"({left})"
+    if kind == '**' and node[2][0] in ('neg', 'pos'):
+        pass  # a signed exponent needs no parentheses: 2 ** -1
+    elif PRECEDENCE[node[2][0]] < precedence or (kind != '**' and PRECEDENCE[node[2][0]] == precedence):
+        right = f"({right})"
+    return f"{left} {kind} {right}"
+
+def format_number(value: Union[int, float]) -> str:
+    """Integers exactly, floats rounded to 12 places to hide binary noise."""
+    if isinstance(value, float):
+        return str(round(value, 12))
+    return str(value)
+
+# Version of the records written by EnhancedRuleBot.snapshot
+SESSION_VERSION = 1
+
+class KeywordMatcher:
+    """Aho-Corasick automaton: finds every labelled keyword in a text in one pass."""
+    
+    def __init__(self):
+        self.goto: List[Dict[str, int]] = [{}]
+        self.fail: List[int] = [0]
+        self.output: List[Tuple[str, ...]] = [()]
+    
+    def add(self, keyword: str, label: str) -> None:
+        """Register a lowercase keyword; matching is by substring, as with `in`."""
+        state = 0
+        for char in keyword:
+            if char not in self.goto[state]:
+                self.goto.append({})
+                self.fail.append(0)
+                self.output.append(())
+                self.goto[state][char] = len(self.goto) - 1
+            state = self.goto[state][char]
+        if label not in self.output[state]:
+            self.output[state] += (label,)
+    
+    def build(self) -> 'KeywordMatcher':
+        """Compute failure links breadth-first and merge outputs along them."""
+        queue = list(self.goto[0].values())
+        for state in queue:
+            for char, child in self.goto[state].items():
+                queue.append(child)
+                fallback = self.fail[state]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[child] = self.goto[fallback].get(char, 0)
+                inherited = self.output[self.fail[child]]
+                self.output[child] += tuple(label for label in inherited
+                                            if label not in self.output[child])
+        return self
+    
+    def find(self, text: str) -> set:
+        """Return the labels of all keywords occurring in text."""
+        goto, fail, output = self.goto, self.fail, self.output
+        labels = set()
+        state = 0
+        for char in text:
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if output[state]:
+                labels.update(output[state])
+        return labels
+
+class Interaction(NamedTuple):
+    """One exchange: Unix timestamp, user input and bot response."""
+    timestamp: float
+    user: str
+    bot: str
+
+class ConversationHistory:
+    """Ring buffer of the latest interactions with running totals and an optional JSONL spill file."""
+    
+    __slots__ = ('records', 'total', 'spill_path', 'batch_size', '_pending')
+    
+    def __init__(self, maxlen: int = 100, spill_path: Optional[str] = None, batch_size: int = 64):
+        """Keep at most maxlen records in memory; append every record to spill_path in batches."""
+        self.records = deque(maxlen=maxlen)
+        self.total = 0
+        self.spill_path = spill_path
+        self.batch_size = batch_size
+        self._pending = []
+    
+    def add(self, user_input: str, bot_response: str, timestamp: Optional[float] = None) -> Interaction:
+        """Record one exchange, timestamped now unless given."""
+        record = Interaction(time.time() if timestamp is None else timestamp, user_input, bot_response)
+        self.records.append(record)
+        self.total += 1
+        if self.spill_path is not None:
+            self._pending.append(json.dumps(record._asdict()) + "\n")
+            if len(self._pending) >= self.batch_size:
+                self.flush()
+        return record
+    
+    def append(self, entry: Union[Interaction, Dict]) -> None:
+        """List-style append of an Interaction or a {'user', 'bot'} dict."""
+        if isinstance(entry, dict):
+            timestamp = entry.get('timestamp')
+            self.add(entry['user'], entry['bot'], timestamp if isinstance(timestamp, float) else None)
+        else:
+            self.add(entry.user, entry.bot, entry.timestamp)
+    
+    def flush(self) -> None:
+        """Write pending records to the spill file."""
+        if self._pending:
+            with open(self.spill_path, "a", encoding="utf-8") as f:
+                f.writelines(self._pending)
+            self._pending = []
+    
+    def __len__(self) -> int:
+        """Total exchanges recorded, including those no longer held in memory."""
+        return self.total
+    
+    def __iter__(self) -> Iterator[Interaction]:
+        return iter(self.records)
+    
+    def __getitem__(self, index: int) -> Interaction:
+        return self.records[index]
+
+class Histogram:
+    """Counts of durations in power-of-two microsecond buckets, with their sum."""
+    
+    # Upper bounds 1us, 2us, 4us, ... ~1s; anything slower goes to +Inf
+    BOUNDS = tuple(2 ** i / 1e6 for i in range(21))
+    
+    __slots__ = ('buckets', 'total', 'count')
+    
+    def __init__(self):
+        self.buckets = [0] * (len(self.BOUNDS) + 1)
+        self.total = 0.0
+        self.count = 0
+    
+    def observe(self, seconds: float) -> None:
+        """Add one duration."""
+        # ceil(log2(microseconds)) without calling log
+        index = (int(seconds * 1e6 + 0.999999) - 1).bit_length() if seconds > 1e-6 else 0
+        self.buckets[min(index, len(self.BOUNDS))] += 1
+        self.total += seconds
+        self.count += 1
+    
+    def merge(self, other: 'Histogram') -> None:
+        """Add another histogram's observations to this one."""
+        for i, count in enumerate(other.buckets):
+            self.buckets[i] += count
+        self.total += other.total
+        self.count += other.count
+    
+    def quantile(self, q: float) -> float:
+        """Upper bound in seconds of the bucket holding the q-quantile."""
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.BOUNDS, self.buckets):
+            seen += count
+            if seen >= rank and count:
+                return bound
+        return float('inf') if self.buckets[-1] else 0.0
+
+class Instrumentation:
+    """Per-intent reply counts and latency histograms plus time spent in each check."""
+    
+    # Stages timed inside a reply, in the order _respond runs them
+    STAGES = ('match', 'name', 'math', 'sentiment', 'topic', 'reply')
+    
+    def __init__(self):
+        self.replies: Dict[str, Histogram] = {}
+        self.stages: Dict[str, Histogram] = {stage: Histogram() for stage in self.STAGES}
+        self._start = 0.0
+        self._mark = 0.0
+    
+    def start(self) -> None:
+        """Begin timing a reply."""
+        self._start = self._mark = time.perf_counter()
+    
+    def lap(self, stage: str) -> None:
+        """Charge the time since the previous lap to stage."""
+        now = time.perf_counter()
+        self.stages[stage].observe(now - self._mark)
+        self._mark = now
+    
+    def finish(self, intent: str) -> None:
+        """Charge the remaining time to 'reply' and the whole reply to intent."""
+        now = time.perf_counter()
+        self.stages['reply'].observe(now - self._mark)
+        if intent not in self.replies:
+            self.replies[intent] = Histogram()
+        self.replies[intent].observe(now - self._start)
+    
+    def merge(self, other: 'Instrumentation') -> None:
+        """Fold in counters from another process or run."""
+        for intent, histogram in other.replies.items():
+            self.replies.setdefault(intent, Histogram()).merge(histogram)
+        for stage, histogram in other.stages.items():
+            self.stages.setdefault(stage, Histogram()).merge(histogram)
+    
+    def stats(self) -> Dict:
+        """Counts and timings per intent and per stage, in milliseconds."""
+        stage_total = sum(histogram.total for histogram in self.stages.values())
+        return {
+            'replies': {
+                intent: {
+                    'count': histogram.count,
+                    'total_ms': round(histogram.total * 1000, 3),
+                    'mean_ms': round(histogram.total / histogram.count * 1000, 4),
+                    'p50_ms': histogram.quantile(0.5) * 1000,
+                    'p99_ms': histogram.quantile(0.99) * 1000
+                }
+                for intent, histogram in sorted(self.replies.items(), key=lambda item: -item[1].total)
+            },
+            'stages': {
+                stage: {
+                    'calls': histogram.count,
+                    'total_ms': round(histogram.total * 1000, 3),
+                    'share': round(histogram.total / stage_total, 4) if stage_total else 0.0
+                }
+                for stage, histogram in self.stages.items()
+            }
+        }
+    
+    def prometheus(self) -> str:
+        """Counters and histograms in the Prometheus text exposition format."""
+        lines = [
+            "# HELP rulebot_replies_total Replies by intent branch.",
+            "# TYPE rulebot_replies_total counter"
+        ]
+        for intent, histogram in self.replies.items():
+            lines.append(f'rulebot_replies_total{{intent="{intent}"}} {histogram.count}')
+        for name, label, histograms, help_text in (
+                ("rulebot_reply_seconds", "intent", self.replies, "Reply latency by intent branch."),
+                ("rulebot_stage_seconds", "stage", self.stages, "Time spent in each check of a reply.")):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} histogram")
+            for key, histogram in histograms.items():
+                cumulative = 0
+                for bound, count in zip(Histogram.BOUNDS, histogram.buckets):
+                    cumulative += count
+                    lines.append(f'{name}_bucket{{{label}="{key}",le="{bound:g}"}} {cumulative}')
+                lines.append(f'{name}_bucket{{{label}="{key}",le="+Inf"}} {histogram.count}')
+                lines.append(f'{name}_sum{{{label}="{key}"}} {histogram.total:.9f}')
+                lines.append(f'{name}_count{{{label}="{key}"}} {histogram.count}')
+        return "\n".join(lines) + "\n"
+    
+    def dump(self, path: str) -> None:
+        """Write prometheus() to path atomically, for a node-exporter textfile collector."""
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            f.write(self.prometheus())
+        os.replace(path + ".tmp", path)
+
+class KnowledgeBase:
+    """Immutable snapshot of response templates and topics with a compiled keyword index."""
+    
+    def __init__(self, topics: Dict[str, Dict], responses: Optional[Dict[str, List[str]]] = None):
+        """Freeze topics and responses and build keyword -> topic posting lists and the matcher."""
+        merged = dict(DEFAULT_RESPONSES)
+        merged.update(responses or {})
+        self.responses = MappingProxyType({kind: tuple(texts) for kind, texts in merged.items()})
+        self.topics = MappingProxyType({
+            topic: MappingProxyType({
+                'keywords': tuple(keyword.lower() for keyword in data['keywords']),
+                'responses': tuple(data['responses'])
+            })
+            for topic, data in topics.items()
+        })
+        
+        # keyword -> topics containing it, in knowledge base order
+        postings = {}
+        for topic, data in self.topics.items():
+            for keyword in data['keywords']:
+                postings.setdefault(keyword, [])
+                if topic not in postings[keyword]:
+                    postings[keyword].append(topic)
+        self.postings = MappingProxyType({keyword: tuple(found) for keyword, found in postings.items()})
+        
+        # Topics win in knowledge base order when several match
+        self.topic_rank = {f"topic:{topic}": rank for rank, topic in enumerate(self.topics)}
+        matcher = KeywordMatcher()
+        for label, keywords in INTENT_KEYWORDS.items():
+            for keyword in keywords:
+                matcher.add(keyword, label)
+        for keyword, found in self.postings.items():
+            for topic in found:
+                matcher.add(keyword, f"topic:{topic}")
+        self.matcher = matcher.build()
+    
+    @classmethod
+    def load(cls, path: str) -> 'KnowledgeBase':
+        """Load a JSON or YAML file, or every such file in a directory (merged in name order)."""
+        topics, responses = {}, {}
+        for file_path in cls.files(path):
+            with open(file_path, encoding="utf-8") as f:
+                if file_path.endswith(".json"):
+                    data = json.load(f)
+                elif yaml is None:
+                    raise ImportError(f"PyYAML is required to load '{file_path}'")
+                else:
+                    data = yaml.safe_load(f)
+            data = data or {}
+            topics.update(data.get('topics', {}))
+            responses.update(data.get('responses', {}))
+        return cls(topics, responses)
+    
+    @staticmethod
+    def files(path: str) -> List[str]:
+        """Knowledge files at path: the file itself, or the directory's JSON/YAML files."""
+        if not os.path.isdir(path):
+            return [path]
+        return [os.path.join(path, name) for name in sorted(os.listdir(path))
+                if name.endswith(('.json', '.yaml', '.yml'))]
+    
+    def topic_for(self, labels: set) -> Optional[str]:
+        """Highest priority topic among matched labels."""
+        topics = [label for label in labels if label in self.topic_rank]
+        if not topics:
+            return None
+        return min(topics, key=self.topic_rank.__getitem__)[len("topic:"):]
+
+class KnowledgeSource:
+    """Holds the current KnowledgeBase; a background thread reloads it when its files change."""
+    
+    def __init__(self, path: Optional[str] = None, interval: float = 2.0):
+        """Load path (or the built-in knowledge) and remember its file signature."""
+        self.path = path
+        self.interval = interval
+        self.last_error = None
+        self._signature = self.signature()
+        self.current = KnowledgeBase.load(path) if path else KnowledgeBase(DEFAULT_TOPICS)
+        self._stop = threading.Event()
+        self._thread = None
+    
+    def signature(self) -> Tuple:
+        """Modification times and sizes of the knowledge files."""
+        if self.path is None:
+            return ()
+        entries = []
+        for file_path in KnowledgeBase.files(self.path):
+            try:
+                stat = os.stat(file_path)
+            except OSError:
+                continue
+            entries.append((file_path, stat.st_mtime_ns, stat.st_size))
+        return tuple(entries)
+    
+    def reload(self) -> bool:
+        """Reload if the files changed; a broken edit keeps the previous snapshot."""
+        signature = self.signature()
+        if signature == self._signature:
+            return False
+        try:
+            snapshot = KnowledgeBase.load(self.path)
+        except Exception as e:
+            # Malformed or half-written files: keep serving the last good snapshot
+            self.last_error = e
+            return False
+        self._signature = signature
+        self.last_error = None
+        # Readers take self.current once per reply, so one assignment
+        # swaps every session over without locking
+        self.current = snapshot
+        return True
+    
+    def start(self) -> None:
+        """Poll for changes every interval seconds on a daemon thread."""
+        if self.path is None or self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._watch, name="knowledge-reload", daemon=True)
+        self._thread.start()
+    
+    def stop(self) -> None:
+        """Stop the polling thread."""
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+    
+    def _watch(self) -> None:
+        while not self._stop.wait(self.interval):
+            self.reload()
+
+class EnhancedRuleBot:
+    # One pass over the input for all four name phrasings; the lookahead
+    # reports every position so the earliest match of the highest priority
+    # phrasing can be chosen, as separate searches in this order would.
+    NAME_PATTERN = re.compile(
+        r"(?=(?:my name is (\w+)|i'm (\w+)|i am (\w+)|call me (\w+)))"
+    )
+    
+    # Shared by every bot that is not given its own source
+    default_source = None
+    
+    # Set to an Instrumentation to record per-intent counts and timings
+    # for every bot; None keeps chatbot_response free of timing calls
+    instrumentation = None
+    
+    # Per-session state only; the knowledge lives in the shared source
+    __slots__ = ('conversation_history', 'user_name', 'user_preferences', 'session_start_time',
+                 'source', 'rng')
+    
+    def __init__(self, history_size: int = 100, history_path: Optional[str] = None,
+                 source: Optional[KnowledgeSource] = None, rng: Optional[random.Random] = None):
+        """Initialize the chatbot with conversation history and personality."""
+        self.conversation_history = ConversationHistory(history_size, history_path)
+        self.user_name = None
+        self.user_preferences = {}
+        self.session_start_time = datetime.now()
+        
+        if source is None:
+            if EnhancedRuleBot.default_source is None:
+                EnhancedRuleBot.default_source = KnowledgeSource()
+            source = EnhancedRuleBot.default_source
+        self.source = source
+        # Template choices; pass a seeded random.Random for repeatable replies
+        self.rng = rng if rng is not None else random
+    
+    @property
+    def knowledge(self) -> KnowledgeBase:
+        """The current knowledge snapshot."""
+        return self.source.current
+    
+    @property
+    def knowledge_base(self) -> MappingProxyType:
+        """Topics of the current knowledge snapshot (read-only)."""
+        return self.source.current.topics
+    
+    @property
+    def greeting_responses(self) -> Tuple[str, ...]:
+        """Greeting templates of the current knowledge snapshot."""
+        return self.source.current.responses['greeting']
+    
+    @property
+    def goodbye_responses(self) -> Tuple[str, ...]:
+        """Goodbye templates of the current knowledge snapshot."""
+        return self.source.current.responses['goodbye']
+    
+    @property
+    def thanks_responses(self) -> Tuple[str, ...]:
+        """Thanks templates of the current knowledge snapshot."""
+        return self.source.current.responses['thanks']
+    
+    def snapshot(self) -> Dict:
+        """Session state (name, preferences, start time, recent history) as a JSON-ready record."""
+        history = self.conversation_history
+        if history.spill_path is not None:
+            history.flush()
+        return {
+            'version': SESSION_VERSION,
+            'user_name': self.user_name,
+            'user_preferences': self.user_preferences,
+            'session_start': self.session_start_time.timestamp(),
+            'history_size': history.records.maxlen,
+            'history_total': history.total,
+            'history': [list(record) for record in history.records]
+        }
+    
+    @classmethod
+    def restore(cls, record: Dict, history_path: Optional[str] = None,
+                source: Optional[KnowledgeSource] = None) -> 'EnhancedRuleBot':
+        """Rebuild a session from a snapshot record."""
+        if record.get('version') != SESSION_VERSION:
+            raise ValueError(
+                f"Unsupported session version {record.get('version')}, expected {SESSION_VERSION}."
+            )
+        bot = cls(record['history_size'], history_path, source)
+        bot.user_name = record['user_name']
+        bot.user_preferences = record['user_preferences']
+        bot.session_start_time = datetime.fromtimestamp(record['session_start'])
+        bot.conversation_history.records.extend(Interaction(*entry) for entry in record['history'])
+        bot.conversation_history.total = record['history_total']
+        return bot
+    
+    def log_interaction(self, user_input: str, bot_response: str) -> None:
+        """Log the conversation for context awareness."""
+        self.conversation_history.add(user_input, bot_response)
+    
+    def extract_name_from_input(self, user_input: str) -> str:
+        """Try to extract user's name from their input."""
+        best = None
+        for match in self.NAME_PATTERN.finditer(user_input.lower()):
+            group = match.lastindex
+            if best is None or group < best.lastindex:
+                best = match
+                if group == 1:
+                    break
+        if best:
+            return best.group(best.lastindex).title()
+        return None
+    
+    def get_sentiment_response(self, user_input: str) -> str:
+        """Provide empathetic responses based on user sentiment."""
+        return self._sentiment_response(self.knowledge.matcher.find(user_input.lower()))
+    
+    def _sentiment_response(self, labels: set) -> str:
+        """Sentiment response for already matched intent labels."""
+        if 'positive' in labels:
+            return "That's wonderful to hear! I'm glad you're feeling positive! "
+        elif 'negative' in labels:
+            return "I'm sorry to hear that. I hope things get better for you soon. "
+        
+        return None
+    
+    def calculate_simple_math(self, user_input: str) -> str:
+        """Evaluate the first arithmetic expression in the input (+ - * / % ** ^, parentheses)."""
+        for match in EXPRESSION_PATTERN.finditer(user_input):
+            # Trim sentence punctuation and unbalanced parentheses
+            candidate = match.group().strip().rstrip('.').rstrip()
+            opened, closed = candidate.count('('), candidate.count(')')
+            start, end = 0, len(candidate)
+            while start < end and candidate[start] == '(' and opened > closed:
+                start += 1
+                opened -= 1
+                while start < end and candidate[start].isspace():
+                    start += 1
+            while end > start and candidate[end - 1] == ')' and closed > opened:
+                end -= 1
+                closed -= 1
+                while end > start and candidate[end - 1].isspace():
+                    end -= 1
+            candidate = candidate[start:end]
+            
+            try:
+                node = parse_expression(candidate)
+            except ExpressionLimitError:
+                return "I had trouble with that calculation. Could you try again?"
+            except ExpressionError:
+                continue
+            if node[0] == 'num' or (node[0] in ('neg', 'pos') and node[1][0] == 'num'):
+                # A lone number is not a calculation
+                continue
+            
+            try:
+                result = evaluate_expression(candidate)
+            except ZeroDivisionError:
+                return "Oops! Can't divide by zero!"
+            except ExpressionError:
+                return "I had trouble with that calculation. Could you try again?"
+            return f"{format_expression(node)} = {format_number(result)}"
+        
+        return None
+    
+    def get_topic_response(self, user_input: str) -> str:
+        """Get response based on topic detection."""
+        knowledge = self.knowledge
+        return self._topic_response(knowledge.matcher.find(user_input.lower()), knowledge)
+    
+    def _topic_response(self, labels: set, knowledge: KnowledgeBase) -> str:
+        """Topic response for already matched intent labels."""
+        topic = knowledge.topic_for(labels)
+        if topic is None:
+            return None
+        return self.rng.choice(knowledge.topics[topic]['responses'])
+    
+    def chatbot_response(self, user_input: str) -> str:
+        """Main response generation method with enhanced logic."""
+        return self._respond(user_input, self.instrumentation)[1]
+    
+    def _respond(self, user_input: str, probe: Optional[Instrumentation] = None) -> Tuple[str, str]:
+        """Pick the reply and name the intent branch that produced it."""
+        if probe is None:
+            return self._answer(user_input, None)
+        probe.start()
+        intent, response = self._answer(user_input, probe)
+        probe.finish(intent)
+        return intent, response
+    
+    def _answer(self, user_input: str, probe: Optional[Instrumentation]) -> Tuple[str, str]:
+        """The intent checks, in priority order; probe laps time the expensive ones."""
+        user_input_clean = user_input.lower().strip()
+        
+        # Handle empty input
+        if not user_input_clean:
+            return 'empty', "I didn't catch that. Could you say something?"
+        
+        # One snapshot per reply, so a reload never changes it midway
+        knowledge = self.knowledge
+        
+        # Every keyword intent, found in a single pass
+        labels = knowledge.matcher.find(user_input_clean)
+        if probe:
+            probe.lap('match')
+        
+        # Extract name if mentioned
+        name = self.extract_name_from_input(user_input_clean) if 'name' in labels else None
+        if probe:
+            probe.lap('name')
+        if name:
+            self.user_name = name
+            return 'name', f"Nice to meet you, {name}! I'll remember your name."
+        
+        # Greeting responses
+        if 'greeting' in labels:
+            response = self.rng.choice(knowledge.responses['greeting'])
+            if self.user_name:
+                response = response.replace("Hello!", f"Hello {self.user_name}!")
+            return 'greeting', response
+        
+        # Bot identity questions
+        if 'identity' in labels:
+            return 'identity', "I am RuleBot, your friendly AI assistant! I love to chat and help out however I can."
+        
+        # Capabilities question
+        if 'capabilities' in labels:
+            capabilities = [
+                " Have friendly conversations",
+                " Tell you the current time",
+                " Do simple math calculations",
+                " Share jokes and fun facts",
+                " Remember your name during our chat",
+                " Respond to your mood and questions"
+            ]
+            return 'capabilities', "Here's what I can do:\n" + "\n".join(capabilities)
+        
+        # Time-related requests
+        if 'time' in labels:
+            current_time = datetime.now().strftime("%H:%M:%S")
+            session_duration = datetime.now() - self.session_start_time
+            return 'time', f"Current time is {current_time}. We've been chatting for {str(session_duration).split('.')[0]}!"
+        
+        # Date requests
+        if 'date' in labels:
+            current_date = datetime.now().strftime("%B %d, %Y")
+            day_name = datetime.now().strftime("%A")
+            return 'date', f"Today is {day_name}, {current_date}."
+        
+        # Math calculations
+        math_result = self.calculate_simple_math(user_input)
+        if probe:
+            probe.lap('math')
+        if math_result:
+            return 'math', f"Let me calculate that: {math_result}"
+        
+        # Sentiment-based responses
+        sentiment_response = self._sentiment_response(labels)
+        if probe:
+            probe.lap('sentiment')
+        if sentiment_response:
+            return 'sentiment', sentiment_response
+        
+        # Topic-based responses
+        topic_response = self._topic_response(labels, knowledge)
+        if probe:
+            probe.lap('topic')
+        if topic_response:
+            return 'topic', topic_response
+        
+        # Conversation history reference
+        if 'remember' in labels and len(self.conversation_history) > 1:
+            return 'remember', f"I remember we were talking about {len(self.conversation_history)} things so far!"
+        
+        # Thanks handling
+        if 'thanks' in labels:
+            response = self.rng.choice(knowledge.responses['thanks'])
+            if self.user_name:
+                response += f" Happy to help you, {self.user_name}!"
+            return 'thanks', response
+        
+        # Goodbye handling
+        if 'goodbye' in labels:
+            response = self.rng.choice(knowledge.responses['goodbye'])
+            if self.user_name:
+                response = response.replace("Goodbye!", f"Goodbye {self.user_name}!")
+            return 'goodbye', response
+        
+        # Age question
+        if 'age' in labels:
+            return 'age', "I'm as old as our conversation! I was created just for you today. "
+        
+        # Location question
+        if 'location' in labels:
+            return 'location', "I exist in the digital realm! I'm here wherever you are chatting with me. "
+        
+        # Default responses with more variety
+        default_responses = [
+            "That's interesting! Could you tell me more about it?",
+            "I'm not sure I understand completely. Could you rephrase that?",
+            "Hmm, that's a new one for me! What would you like to know?",
+            "I'd love to help, but I need a bit more context. Can you elaborate?",
+            "That sounds intriguing! Want to chat about something else I might know better?",
+        ]
+        
+        return 'default', self.rng.choice(default_responses)
+    
+    def get_conversation_summary(self) -> str:
+        """Provide a summary of the conversation."""
+        total_interactions = len(self.conversation_history)
+        session_duration = datetime.now() - self.session_start_time
+        
+        summary = f"""
+Conversation Summary:
+• Total exchanges: {total_interactions}
+• Session duration: {str(session_duration).split('.')[0]}
+• Your name: {self.user_name if self.user_name else 'Not shared'}
+• Started: {self.session_start_time.strftime('%H:%M:%S')}
+        """
+        return summary.strip()
+
+class SessionStore:
+    """Interface for session stores: serialized session records by session ID."""
+    
+    def get(self, session_id: str) -> Optional[bytes]:
+        """Return the stored record, or None."""
+        raise NotImplementedError
+    
+    def put(self, session_id: str, data: bytes) -> None:
+        """Store or replace a record."""
+        raise NotImplementedError
+    
+    def delete(self, session_id: str) -> None:
+        """Forget a session."""
+        raise NotImplementedError
+    
+    def save(self, session_id: str, bot: 'EnhancedRuleBot') -> None:
+        """Snapshot a bot into the store as compact JSON."""
+        self.put(session_id, json.dumps(bot.snapshot(), separators=(',', ':')).encode())
+    
+    def load(self, session_id: str, source: Optional[KnowledgeSource] = None) -> Optional['EnhancedRuleBot']:
+        """Resume a bot from the store, or None if the session is unknown."""
+        data = self.get(session_id)
+        if data is None:
+            return None
+        return EnhancedRuleBot.restore(json.loads(data), source=source)
+
+class MemorySessionStore(SessionStore):
+    """In-process store that evicts least recently used sessions beyond max_bytes."""
+    
+    def __init__(self, max_bytes: int = 64 * 2 ** 20):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.records: "OrderedDict[str, bytes]" = OrderedDict()
+    
+    def get(self, session_id: str) -> Optional[bytes]:
+        data = self.records.get(session_id)
+        if data is not None:
+            self.records.move_to_end(session_id)
+        return data
+    
+    def put(self, session_id: str, data: bytes) -> None:
+        self.delete(session_id)
+        self.records[session_id] = data
+        self.size += len(data)
+        while self.size > self.max_bytes and len(self.records) > 1:
+            _, dropped = self.records.popitem(last=False)
+            self.size -= len(dropped)
+    
+    def delete(self, session_id: str) -> None:
+        data = self.records.pop(session_id, None)
+        if data is not None:
+            self.size -= len(data)
+
+class SQLiteSessionStore(SessionStore):
+    """Local SQLite store in WAL mode, shareable by worker processes on one host."""
+    
+    def __init__(self, path: str):
+        self.path = path
+        self.connection = sqlite3.connect(path, isolation_level=None)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS sessions "
+            "(id TEXT PRIMARY KEY, data BLOB NOT NULL, updated REAL NOT NULL)"
+        )
+    
+    def get(self, session_id: str) -> Optional[bytes]:
+        row = self.connection.execute(
+            "SELECT data FROM sessions WHERE id = ?", (session_id,)
+        ).fetchone()
+        return row[0] if row else None
+    
+    def put(self, session_id: str, data: bytes) -> None:
+        self.connection.execute(
+            "INSERT OR REPLACE INTO sessions (id, data, updated) VALUES (?, ?, ?)",
+            (session_id, data, time.time())
+        )
+    
+    def delete(self, session_id: str) -> None:
+        self.connection.execute("DELETE FROM sessions WHERE id = ?", (session_id,))
+    
+    def close(self) -> None:
+        self.connection.close()
+
+class ChatServer:
+    """Asyncio line-protocol server hosting one EnhancedRuleBot session per connection."""
+    
+    def __init__(self, host: str = "127.0.0.1", port: int = 8765,
+                 max_sessions: int = 100000, latency_window: int = 10000,
+                 source: Optional[KnowledgeSource] = None, store: Optional[SessionStore] = None,
+                 metrics_path: Optional[str] = None):
+        """Set up the session table and the reply latency window."""
+        self.host = host
+        self.port = port
+        self.max_sessions = max_sessions
+        # session id -> bot, least recently used first; without a store,
+        # detached sessions stay here until evicted so a client can
+        # reattach with HELLO <id>
+        self.sessions: "OrderedDict[str, EnhancedRuleBot]" = OrderedDict()
+        self.attached = set()
+        self.latencies = deque(maxlen=latency_window)
+        self.messages = 0
+        self.server = None
+        self.source = source or KnowledgeSource()
+        # With a store, detached sessions live there instead: they survive
+        # restarts and can be resumed by any server sharing it
+        self.store = store
+        self.metrics_path = metrics_path
+    
+    def new_session(self) -> str:
+        """Create a session and return its id, evicting the oldest detached ones if full."""
+        session_id = uuid.uuid4().hex
+        self.sessions[session_id] = EnhancedRuleBot(source=self.source)
+        while len(self.sessions) > self.max_sessions:
+            old_id = next((sid for sid in self.sessions if sid not in self.attached), None)
+            if old_id is None:
+                break
+            del self.sessions[old_id]
+        return session_id
+    
+    def detach(self, session_id: str) -> None:
+        """Release a session no connection is using; with a store it moves there."""
+        self.attached.discard(session_id)
+        if self.store is not None and session_id in self.sessions:
+            # The store is the only copy, so another server may resume it
+            self.store.save(session_id, self.sessions.pop(session_id))
+    
+    def attach(self, session_id: str) -> bool:
+        """Make a detached session current, resuming it from the store if needed."""
+        if session_id in self.attached:
+            return False
+        if session_id not in self.sessions:
+            bot = self.store.load(session_id, self.source) if self.store is not None else None
+            if bot is None:
+                return False
+            self.sessions[session_id] = bot
+        self.attached.add(session_id)
+        return True
+    
+    def reply(self, session_id: str, message: str) -> Tuple[str, bool]:
+        """Answer one line for a session; the flag says whether to close the connection."""
+        bot = self.sessions[session_id]
+        self.sessions.move_to_end(session_id)
+        start = time.perf_counter()
+        
+        if message == "STATS":
+            return self.stats(), False
+        if message == "METRICS":
+            return self.metrics(), False
+        if message.lower() in ['exit', 'quit']:
+            response = random.choice(bot.goodbye_responses) + "\n" + bot.get_conversation_summary()
+            del self.sessions[session_id]
+            if self.store is not None:
+                self.store.delete(session_id)
+            return response, True
+        if message.lower() == 'summary':
+            response = bot.get_conversation_summary()
+        else:
+            response = bot.chatbot_response(message)
+            bot.log_interaction(message, response)
+        
+        self.messages += 1
+        self.latencies.append(time.perf_counter() - start)
+        return response, False
+    
+    def latency_percentile(self, percent: float) -> float:
+        """Reply latency in milliseconds at the given percentile of the recent window."""
+        return percentile(sorted(self.latencies), percent) * 1000
+    
+    def stats(self) -> str:
+        """One-line server statistics, as returned by the STATS command."""
+        return (f"sessions={len(self.sessions)} connected={len(self.attached)} "
+                f"messages={self.messages} p50_ms={self.latency_percentile(50):.3f} "
+                f"p99_ms={self.latency_percentile(99):.3f}")
+    
+    def metrics(self) -> str:
+        """Prometheus text for the METRICS command, also written to metrics_path if set."""
+        probe = EnhancedRuleBot.instrumentation
+        if probe is None:
+            return "Metrics are off; start the server with --metrics."
+        if self.metrics_path is not None:
+            probe.dump(self.metrics_path)
+        return probe.prometheus().rstrip("\n")
+    
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """Serve one connection: a line in, a line out (newlines in replies escaped as \\n)."""
+        session_id = self.new_session()
+        self.attached.add(session_id)
+        writer.write(f"SESSION {session_id}\n".encode())
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                message = line.decode(errors="replace").strip()
+                
+                # HELLO <id> reattaches to a session kept from an earlier connection
+                if message.startswith("HELLO "):
+                    requested = message[len("HELLO "):].strip()
+                    if requested != session_id and self.attach(requested):
+                        self.attached.discard(session_id)
+                        self.sessions.pop(session_id, None)
+                        session_id = requested
+                    writer.write(f"SESSION {session_id}\n".encode())
+                    await writer.drain()
+                    continue
+                
+                response, done = self.reply(session_id, message)
+                writer.write(response.replace("\n", "\\n").encode() + b"\n")
+                await writer.drain()
+                if done:
+                    break
+        except (ConnectionError, ValueError):
+            # ValueError: a line longer than the stream limit
+            pass
+        finally:
+            self.detach(session_id)
+            writer.close()
+    
+    async def serve_forever(self) -> None:
+        """Listen on host:port until cancelled."""
+        self.server = await asyncio.start_server(self.handle, self.host, self.port,
+                                                  backlog=1024)
+        async with self.server:
+            await self.server.serve_forever()
+
+def percentile(ordered: List[float], percent: float) -> float:
+    """Nearest-rank percentile of an already sorted list (0.0 if empty)."""
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(len(ordered) * percent / 100))]
+
+def read_transcript(path: str) -> "OrderedDict[str, List[str]]":
+    """Messages per session, in file order: JSONL {"session", "message"} records or plain lines."""
+    sessions = OrderedDict()
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.rstrip("\n")
+            if line.startswith("{"):
+                record = json.loads(line)
+                session, message = str(record.get("session", "default")), record["message"]
+            else:
+                session, message = "default", line
+            sessions.setdefault(session, []).append(message)
+    return sessions
+
+def session_rng(seed: Optional[int], session: str) -> random.Random:
+    """Random templates for one session, reproducible from (seed, session) in any worker."""
+    if seed is None:
+        return random.Random()
+    return random.Random(zlib.crc32(f"{seed}:{session}".encode()))
+
+def _replay_sessions(sessions: List[Tuple[str, List[str]]], seed: Optional[int],
+                     knowledge_path: Optional[str], instrument: bool = False
+                     ) -> Tuple[Dict[str, int], List[float], Optional[Instrumentation]]:
+    """Run whole sessions through fresh bots; return intent counts, latencies and probe."""
+    source = KnowledgeSource(knowledge_path)
+    probe = Instrumentation() if instrument else None
+    counts = {}
+    latencies = []
+    for session, messages in sessions:
+        bot = EnhancedRuleBot(source=source, rng=session_rng(seed, session))
+        for message in messages:
+            start = time.perf_counter()
+            intent, response = bot._respond(message, probe)
+            bot.log_interaction(message, response)
+            latencies.append(time.perf_counter() - start)
+            counts[intent] = counts.get(intent, 0) + 1
+    return counts, latencies, probe
+
+def replay_transcript(path: str, workers: int = 1, seed: Optional[int] = None,
+                      knowledge_path: Optional[str] = None, metrics_path: Optional[str] = None) -> Dict:
+    """Replay a transcript through the bot and report throughput, intent counts and latency.
+    
+    With metrics_path, replies are also instrumented: the report gains per-stage
+    timings and the Prometheus text is written to metrics_path.
+    """
+    sessions = read_transcript(path)
+    start = time.perf_counter()
+    
+    # Each session stays in one worker so its history and name carry over
+    partitions = [[] for _ in range(max(1, workers))]
+    for session, messages in sessions.items():
+        partitions[zlib.crc32(session.encode()) % len(partitions)].append((session, messages))
+    instrument = metrics_path is not None
+    if workers <= 1:
+        results = [_replay_sessions(partitions[0], seed, knowledge_path, instrument)]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(_replay_sessions, partitions, [seed] * workers,
+                                    [knowledge_path] * workers, [instrument] * workers))
+    elapsed = time.perf_counter() - start
+    
+    counts = {}
+    latencies = []
+    probe = Instrumentation() if instrument else None
+    for partition_counts, partition_latencies, partition_probe in results:
+        for intent, count in partition_counts.items():
+            counts[intent] = counts.get(intent, 0) + count
+        latencies.extend(partition_latencies)
+        if probe is not None:
+            probe.merge(partition_probe)
+    latencies.sort()
+    
+    report = {
+        'messages': len(latencies),
+        'sessions': len(sessions),
+        'workers': max(1, workers),
+        'seconds': round(elapsed, 3),
+        'messages_per_second': round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        'intents': dict(sorted(counts.items(), key=lambda item: -item[1])),
+        'latency_ms': {
+            'p50': round(percentile(latencies, 50) * 1000, 4),
+            'p90': round(percentile(latencies, 90) * 1000, 4),
+            'p99': round(percentile(latencies, 99) * 1000, 4),
+            'max': round(percentile(latencies, 100) * 1000, 4)
+        }
+    }
+    if probe is not None:
+        report['stages'] = probe.stats()['stages']
+        probe.dump(metrics_path)
+    return report
+
+def main(argv: Optional[List[str]] = None):
+    """Main function to run the enhanced chatbot."""
+    parser = argparse.ArgumentParser(description="Enhanced RuleBot")
+    parser.add_argument("--serve", action="store_true", help="run the multi-session TCP server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--history", metavar="PATH", help="append the conversation to a JSONL file")
+    parser.add_argument("--knowledge", metavar="PATH",
+                        help="JSON/YAML knowledge file or directory, reloaded when it changes")
+    parser.add_argument("--reload-interval", type=float, default=2.0)
+    parser.add_argument("--sessions", metavar="PATH",
+                        help="SQLite file where the server keeps sessions for resuming")
+    parser.add_argument("--replay", metavar="PATH",
+                        help="replay a transcript (plain lines or JSONL with session/message) and report")
+    parser.add_argument("--workers", type=int, default=1, help="replay processes")
+    parser.add_argument("--seed", type=int, help="seed for repeatable template choices")
+    parser.add_argument("--metrics", metavar="PATH",
+                        help="instrument replies and write Prometheus text to PATH")
+    args = parser.parse_args(argv)
+    
+    if args.replay:
+        report = replay_transcript(args.replay, args.workers, args.seed, args.knowledge, args.metrics)
+        print(json.dumps(report, indent=2))
+        return
+    
+    if args.metrics:
+        EnhancedRuleBot.instrumentation = Instrumentation()
+    
+    source = KnowledgeSource(args.knowledge, args.reload_interval)
+    source.start()
+    
+    if args.serve:
+        store = SQLiteSessionStore(args.sessions) if args.sessions else None
+        server = ChatServer(args.host, args.port, source=source, store=store,
+                            metrics_path=args.metrics)
+        print(f"RuleBot server listening on {args.host}:{args.port}")
+        try:
+            asyncio.run(server.serve_forever())
+        except KeyboardInterrupt:
+            print(server.stats())
+            if args.metrics:
+                server.metrics()
+        return
+    
+    bot = EnhancedRuleBot(history_path=args.history, source=source)
+    
+    print("=" * 60)
+    print(" Welcome to Enhanced RuleBot! ")
+    print("=" * 60)
+    print("I'm your friendly AI assistant!")
+    print("Type 'exit', 'quit', or 'bye' to end our conversation.")
+    print("Type 'summary' to see our conversation stats.")
+    print("-" * 60)
+    
+    while True:
+        try:
+            user_input = input("\n  You: ").strip()
+            
+            # Check for exit conditions
+            if user_input.lower() in ['exit', 'quit']:
+                print(f"\n RuleBot: {random.choice(bot.goodbye_responses)}")
+                print(bot.get_conversation_summary())
+                break
+            
+            # Special command for conversation summary
+            if user_input.lower() == 'summary':
+                print(f"\n RuleBot: {bot.get_conversation_summary()}")
+                continue
+            
+            # Get bot response
+            response = bot.chatbot_response(user_input)
+            print(f" RuleBot: {response}")
+            
+            # Log the interaction
+            bot.log_interaction(user_input, response)
+            
+        except KeyboardInterrupt:
+            print(f"\n\n🤖 RuleBot: Looks like you used Ctrl+C! {random.choice(bot.goodbye_responses)}")
+            print(bot.get_conversation_summary())
+            break
+        except Exception as e:
+            print(f" RuleBot: Oops! Something went wrong. Let's keep chatting though! ")
+    
+    bot.conversation_history.flush()
+    if args.metrics:
+        EnhancedRuleBot.instrumentation.dump(args.metrics)
+
+if __name__ == "__main__":
     main()
\ No newline at end of file
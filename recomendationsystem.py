@@ -1,166 +1,1704 @@
-import pandas as pd
-import numpy as np
-from sklearn.neighbors import NearestNeighbors
-from sklearn.metrics.pairwise import cosine_similarity
-from typing import Dict, List, Tuple, Optional
-
-class BookRecommendationSystem:
-    def __init__(self, similarity_threshold: float = 3.5):
-        self.similarity_threshold = similarity_threshold
-        self.model = None
-        self.user_book_matrix = None
-        self.df = None
-    
-    def load_data(self, data: Dict) -> None:
-        self.df = pd.DataFrame(data)
-        self.user_book_matrix = self.df.pivot_table(
-            index='user', 
-            columns='book', 
-            values='rating'
-        ).fillna(0)
-        
-        self.model = NearestNeighbors(metric='cosine', algorithm='brute')
-        self.model.fit(self.user_book_matrix)
-    
-    def get_user_similarity_matrix(self) -> pd.DataFrame:
-        similarity_matrix = cosine_similarity(self.user_book_matrix)
-        return pd.DataFrame(
-            similarity_matrix,
-            index=self.user_book_matrix.index,
-            columns=self.user_book_matrix.index
-        )
-    
-    def get_similar_users(self, user: str, n_users: int = 3) -> List[Tuple[str, float]]:
-        if user not in self.user_book_matrix.index:
-            return []
-        
-        user_index = self.user_book_matrix.index.tolist().index(user)
-        distances, indices = self.model.kneighbors(
-            self.user_book_matrix.iloc[user_index, :].values.reshape(1, -1),
-            n_neighbors=n_users + 1
-        )
-        
-        similar_users = []
-        for i, idx in enumerate(indices.flatten()[1:]):
-            similar_user = self.user_book_matrix.index[idx]
-            similarity = 1 - distances.flatten()[i + 1]
-            similar_users.append((similar_user, similarity))
-        
-        return similar_users
-    
-    def recommend_books(self, user: str, n_recommendations: int = 3, 
-                       show_details: bool = True) -> Optional[List[Tuple[str, float]]]:
-        if user not in self.user_book_matrix.index:
-            if show_details:
-                print(f"  User '{user}' not found in dataset.")
-                self._show_available_users()
-            return None
-        
-        user_ratings = self.user_book_matrix.loc[user]
-        read_books = user_ratings[user_ratings > 0].index.tolist()
-        
-        if show_details:
-            print(f"\n User: {user}")
-            print(f" Books already rated: {', '.join(read_books)}")
-        
-        similar_users = self.get_similar_users(user, n_users=3)
-        
-        if show_details:
-            print(f" Most similar users:")
-            for sim_user, similarity in similar_users:
-                print(f"   - {sim_user} (similarity: {similarity:.3f})")
-        
-        recommendations = {}
-        for sim_user, user_similarity in similar_users:
-            sim_user_ratings = self.user_book_matrix.loc[sim_user]
-            
-            for book, rating in sim_user_ratings.items():
-                if rating >= self.similarity_threshold and user_ratings[book] == 0:
-                    weighted_score = rating * user_similarity
-                    recommendations[book] = recommendations.get(book, 0) + weighted_score
-        
-        recommended_books = sorted(
-            recommendations.items(), 
-            key=lambda x: x[1], 
-            reverse=True
-        )[:n_recommendations]
-        
-        if show_details:
-            self._display_recommendations(user, recommended_books, n_recommendations)
-        
-        return recommended_books
-    
-    def _display_recommendations(self, user: str, recommendations: List[Tuple[str, float]], 
-                               n_recommendations: int) -> None:
-        print(f"\n Top {n_recommendations} Book Recommendations for {user}:")
-        if recommendations:
-            for i, (book, score) in enumerate(recommendations, 1):
-                print(f"   {i}. {book} (score: {score:.2f})")
-        else:
-            print("   No new recommendations available based on current data.")
-    
-    def _show_available_users(self) -> None:
-        users = list(self.user_book_matrix.index)
-        print(f"Available users: {', '.join(users)}")
-    
-    def get_user_stats(self, user: str) -> Optional[Dict]:
-        if user not in self.user_book_matrix.index:
-            return None
-        
-        user_ratings = self.user_book_matrix.loc[user]
-        rated_books = user_ratings[user_ratings > 0]
-        
-        return {
-            'total_books_rated': len(rated_books),
-            'average_rating': rated_books.mean(),
-            'favorite_books': rated_books[rated_books == rated_books.max()].index.tolist(),
-            'books_rated': dict(rated_books)
-        }
-    
-    def display_dataset_overview(self) -> None:
-        print("=" * 50)
-        print("DATASET OVERVIEW")
-        print("=" * 50)
-        print(f"Total users: {len(self.user_book_matrix.index)}")
-        print(f"Total books: {len(self.user_book_matrix.columns)}")
-        print(f"Total ratings: {len(self.df)}")
-        print(f"Rating range: {self.df['rating'].min()} - {self.df['rating'].max()}")
-        print(f"Average rating: {self.df['rating'].mean():.2f}")
-        
-        print(f"\n Books in dataset:")
-        for book in self.user_book_matrix.columns:
-            avg_rating = self.df[self.df['book'] == book]['rating'].mean()
-            rating_count = len(self.df[self.df['book'] == book])
-            print(f"   - {book} (avg: {avg_rating:.1f}, {rating_count} ratings)")
-
-# ==================== MAIN EXECUTION ====================
-if __name__ == "__main__":
-    recommender = BookRecommendationSystem(similarity_threshold=3.5)
-
-    # Collect data at runtime
-    users, books, ratings = [], [], []
-    print("Enter book ratings data. Type 'done' to finish.")
-    while True:
-        user = input("Enter user name (or 'done' to stop): ").strip()
-        if user.lower() == 'done':
-            break
-        book = input("Enter book title: ").strip()
-        try:
-            rating = float(input("Enter rating (1-5): ").strip())
-        except ValueError:
-            print("Invalid rating. Skipping...")
-            continue
-        users.append(user)
-        books.append(book)
-        ratings.append(rating)
-
-    data = {'user': users, 'book': books, 'rating': ratings}
-
-    recommender.load_data(data)
-    recommender.display_dataset_overview()
-
-    while True:
-        query_user = input("\nEnter user name for recommendations (or 'exit' to quit): ").strip()
-        if query_user.lower() == 'exit':
-            break
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+import pandas as pd
+import numpy as np
+from sklearn.neighbors import NearestNeighbors
+from sklearn.metrics.pairwise import cosine_similarity
+from sklearn.preprocessing import normalize
+import scipy.sparse as sp
+from typing import Dict, Iterator, List, Tuple, Optional, Union
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+Matrix = Union[np.ndarray, sp.csr_matrix]
+
+SNAPSHOT_VERSION = 1
+# Sparse add_ratings merges pending new cells into the CSR matrix once they
+# reach this fraction of its stored cells
+PENDING_MERGE_FRACTION = 1 / 16
+
+
+def _save_matrix(path: str, prefix: str, X: Matrix) -> Dict:
+    if sp.issparse(X):
+        np.save(os.path.join(path, f"{prefix}_data.npy"), X.data)
+        np.save(os.path.join(path, f"{prefix}_indices.npy"), X.indices)
+        np.save(os.path.join(path, f"{prefix}_indptr.npy"), X.indptr)
+        return {'format': 'csr', 'shape': list(X.shape)}
+    np.save(os.path.join(path, f"{prefix}.npy"), np.asarray(X))
+    return {'format': 'dense', 'shape': list(X.shape)}
+
+
+def _load_matrix(path: str, prefix: str, info: Dict, mmap_mode: Optional[str] = None) -> Matrix:
+    if info['format'] == 'csr':
+        arrays = [
+            np.load(os.path.join(path, f"{prefix}_{part}.npy"), mmap_mode=mmap_mode)
+            for part in ('data', 'indices', 'indptr')
+        ]
+        return sp.csr_matrix(tuple(arrays), shape=tuple(info['shape']), copy=False)
+    return np.load(os.path.join(path, f"{prefix}.npy"), mmap_mode=mmap_mode)
+
+
+def _top_k_block(matrix: Matrix, start: int, stop: int, top_k: int) -> Tuple[np.ndarray, np.ndarray]:
+    return _top_k_rows(matrix, np.arange(start, stop), top_k)
+
+
+def _top_k_rows(matrix: Matrix, rows: np.ndarray, top_k: int) -> Tuple[np.ndarray, np.ndarray]:
+    # Top-k cosine neighbours of the given rows of a row-normalised matrix,
+    # excluding each row itself; most similar first, ties by index
+    if top_k == 0:
+        return np.empty((len(rows), 0), dtype=np.int64), np.empty((len(rows), 0))
+    # matrix @ rows.T, not rows @ matrix.T: the latter re-sorts the whole
+    # sparse matrix into CSR for the transpose on every call
+    block = matrix @ matrix[rows].T
+    block = (block.toarray() if sp.issparse(block) else np.asarray(block)).T
+    block[np.arange(len(rows)), rows] = -np.inf
+    
+    indices = np.argpartition(-block, top_k - 1, axis=1)[:, :top_k]
+    similarities = np.take_along_axis(block, indices, axis=1)
+    order = np.lexsort((indices, -similarities))
+    return np.take_along_axis(indices, order, axis=1), np.take_along_axis(similarities, order, axis=1)
+
+
+_worker_matrix = None
+
+
+def _init_similarity_worker(matrix: Matrix) -> None:
+    global _worker_matrix
+    _worker_matrix = matrix
+
+
+def _similarity_worker(start: int, stop: int, top_k: int) -> Tuple[np.ndarray, np.ndarray]:
+    return _top_k_block(_worker_matrix, start, stop, top_k)
+
+
+def top_k_neighborhoods(X: Matrix, top_k: int = 10, block_size: int = 1024, n_jobs: int = 1,
+                        path: Optional[str] = None) -> Tuple[np.ndarray, np.ndarray]:
+    # Top-k cosine neighbours of every row of X, computed block_size rows at
+    # a time so memory stays O(block_size x rows) rather than O(rows^2).
+    # With path, results go straight into indices.npy / similarities.npy
+    # memory maps as each block finishes.
+    n_rows = X.shape[0]
+    if n_rows <= 1:
+        # No other rows to be neighbours
+        indices, similarities = np.empty((n_rows, 0), dtype=np.int64), np.empty((n_rows, 0))
+        if path is not None:
+            os.makedirs(path, exist_ok=True)
+            np.save(os.path.join(path, 'indices.npy'), indices)
+            np.save(os.path.join(path, 'similarities.npy'), similarities)
+        return indices, similarities
+    top_k = min(top_k, n_rows - 1)
+    matrix = normalize(X)
+    
+    if path is not None:
+        os.makedirs(path, exist_ok=True)
+        indices = np.lib.format.open_memmap(
+            os.path.join(path, 'indices.npy'), mode='w+', dtype=np.int64, shape=(n_rows, top_k)
+        )
+        similarities = np.lib.format.open_memmap(
+            os.path.join(path, 'similarities.npy'), mode='w+', dtype=np.float64, shape=(n_rows, top_k)
+        )
+    else:
+        indices = np.empty((n_rows, top_k), dtype=np.int64)
+        similarities = np.empty((n_rows, top_k))
+    
+    starts = list(range(0, n_rows, block_size))
+    stops = [min(start + block_size, n_rows) for start in starts]
+    if n_jobs == 1 or len(starts) == 1:
+        results = (_top_k_block(matrix, start, stop, top_k) for start, stop in zip(starts, stops))
+        for start, stop, (block_indices, block_similarities) in zip(starts, stops, results):
+            indices[start:stop] = block_indices
+            similarities[start:stop] = block_similarities
+    else:
+        with ProcessPoolExecutor(n_jobs, initializer=_init_similarity_worker,
+                                 initargs=(matrix,)) as executor:
+            results = executor.map(_similarity_worker, starts, stops, [top_k] * len(starts))
+            for start, stop, (block_indices, block_similarities) in zip(starts, stops, results):
+                indices[start:stop] = block_indices
+                similarities[start:stop] = block_similarities
+    
+    if path is not None:
+        indices.flush()
+        similarities.flush()
+    return indices, similarities
+
+
+class NeighborIndex:
+    # Cosine nearest-neighbour search over the rows of a user x book matrix.
+    # query() follows NearestNeighbors.kneighbors: (distances, indices) with
+    # distance = 1 - cosine similarity, nearest first.
+    name = ''
+    # Whether query() returns the true nearest neighbours
+    exact = False
+    
+    def build(self, X: Matrix) -> 'NeighborIndex':
+        raise NotImplementedError
+    
+    def query(self, X: Matrix, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        raise NotImplementedError
+    
+    def params(self) -> Dict:
+        return {}
+    
+    def update(self, X: Matrix, rows: np.ndarray) -> None:
+        # X is the full matrix after the given rows changed or were appended
+        self.build(X)
+    
+    def remove(self, X: Matrix, row: int) -> None:
+        # X is the full matrix after the given row was deleted
+        self.build(X)
+    
+    def save(self, path: str, include_data: bool = True) -> None:
+        os.makedirs(path, exist_ok=True)
+        meta = {'backend': self.name, 'params': self.params(), 'data': None}
+        if include_data:
+            meta['data'] = _save_matrix(path, 'data', self.data)
+        for key, array in self._state().items():
+            np.save(os.path.join(path, f"{key}.npy"), array)
+        with open(os.path.join(path, 'index.json'), 'w') as f:
+            json.dump(meta, f)
+    
+    @staticmethod
+    def load(path: str, X: Optional[Matrix] = None,
+             mmap_mode: Optional[str] = None) -> 'NeighborIndex':
+        # X replaces the stored training matrix, e.g. when the caller
+        # already holds it and the index was saved with include_data=False.
+        with open(os.path.join(path, 'index.json')) as f:
+            meta = json.load(f)
+        if X is None:
+            if meta['data'] is None:
+                raise ValueError(f"Index at '{path}' was saved without its data matrix.")
+            X = _load_matrix(path, 'data', meta['data'], mmap_mode)
+        index = NEIGHBOR_INDEXES[meta['backend']](**meta['params'])
+        state = {
+            os.path.splitext(name)[0]: np.load(os.path.join(path, name), mmap_mode=mmap_mode)
+            for name in os.listdir(path)
+            if name.endswith('.npy') and not name.startswith('data')
+        }
+        index._restore(X, state)
+        return index
+    
+    def _state(self) -> Dict[str, np.ndarray]:
+        return {}
+    
+    def _restore(self, X: Matrix, state: Dict[str, np.ndarray]) -> None:
+        self.build(X)
+    
+    def recall_at_k(self, X: Matrix, k: int = 10, n_queries: int = 1000,
+                    random_state: int = 0) -> Dict[str, float]:
+        # Compare against exact brute-force neighbours on a sample of rows
+        n_rows = X.shape[0]
+        k = min(k, n_rows)
+        rng = np.random.default_rng(random_state)
+        rows = np.sort(rng.choice(n_rows, size=min(n_queries, n_rows), replace=False))
+        queries = X[rows]
+        
+        start = time.perf_counter()
+        _, approx = self.query(queries, k)
+        index_seconds = time.perf_counter() - start
+        
+        start = time.perf_counter()
+        _, exact = BruteForceIndex().build(X).query(queries, k)
+        brute_seconds = time.perf_counter() - start
+        
+        hits = sum(len(np.intersect1d(a, e)) for a, e in zip(approx, exact))
+        return {
+            'k': k,
+            'queries': len(rows),
+            'recall': hits / (k * len(rows)),
+            'index_ms_per_query': 1000 * index_seconds / len(rows),
+            'brute_ms_per_query': 1000 * brute_seconds / len(rows)
+        }
+
+
+class BruteForceIndex(NeighborIndex):
+    name = 'brute'
+    exact = True
+    
+    def __init__(self):
+        self.data = None
+        self.model = None
+        self.stale = False
+    
+    def build(self, X: Matrix) -> 'BruteForceIndex':
+        self.data = X
+        self.model = NearestNeighbors(metric='cosine', algorithm='brute')
+        self.model.fit(X)
+        self.stale = False
+        return self
+    
+    def update(self, X: Matrix, rows: np.ndarray) -> None:
+        # Fitting is just storing the matrix, so defer it to the next query
+        # and let a burst of updates share one refit.
+        self.data = X
+        self.stale = True
+    
+    def remove(self, X: Matrix, row: int) -> None:
+        self.update(X, np.array([row]))
+    
+    def query(self, X: Matrix, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        if self.stale:
+            self.build(self.data)
+        return self.model.kneighbors(X, n_neighbors=k)
+
+
+class LSHIndex(NeighborIndex):
+    # Random-hyperplane LSH: each table hashes a row to the sign pattern of
+    # n_bits random projections, so rows with a small angle between them
+    # tend to share a bucket. Candidates from all tables are re-ranked with
+    # exact cosine distance.
+    name = 'lsh'
+    
+    def __init__(self, n_tables: int = 8, n_bits: int = 12, random_state: int = 0,
+                 block_size: int = 65536, max_dirty: int = 4096):
+        self.n_tables = n_tables
+        self.n_bits = n_bits
+        self.random_state = random_state
+        self.block_size = block_size
+        self.max_dirty = max_dirty
+        # Rows re-hashed since the sorted code tables were last rebuilt
+        self.dirty = np.empty(0, dtype=np.int64)
+        self.data = None
+        self.planes = None
+        self.codes = None
+        self.order = None
+        self.sorted_codes = None
+        self.norms = None
+    
+    def params(self) -> Dict:
+        return {
+            'n_tables': self.n_tables,
+            'n_bits': self.n_bits,
+            'random_state': self.random_state,
+            'block_size': self.block_size,
+            'max_dirty': self.max_dirty
+        }
+    
+    def build(self, X: Matrix) -> 'LSHIndex':
+        rng = np.random.default_rng(self.random_state)
+        self.data = X
+        self.planes = rng.standard_normal(
+            (X.shape[1], self.n_tables * self.n_bits)
+        ).astype(np.float32)
+        self.codes = self._hash(X)
+        self.norms = self._row_norms(X)
+        self._sort_codes()
+        return self
+    
+    def update(self, X: Matrix, rows: np.ndarray) -> None:
+        self.data = X
+        if X.shape[1] > self.planes.shape[0]:
+            # New books: old rows are zero there, so their codes still hold
+            rng = np.random.default_rng([self.random_state, self.planes.shape[0]])
+            extra = rng.standard_normal(
+                (X.shape[1] - self.planes.shape[0], self.planes.shape[1])
+            ).astype(np.float32)
+            self.planes = np.vstack([self.planes, extra])
+        
+        n_old = len(self.codes)
+        if X.shape[0] > n_old:
+            self.codes = np.vstack([self.codes, np.zeros((X.shape[0] - n_old, self.n_tables), dtype=np.int64)])
+            self.norms = np.concatenate([self.norms, np.zeros(X.shape[0] - n_old)])
+        elif not self.codes.flags.writeable:
+            self.codes, self.norms = np.array(self.codes), np.array(self.norms)
+        
+        rows = np.unique(rows)
+        changed = X[rows]
+        self.codes[rows] = self._hash(changed)
+        self.norms[rows] = self._row_norms(changed)
+        self.dirty = np.union1d(self.dirty, rows)
+        if len(self.dirty) > self.max_dirty:
+            self._sort_codes()
+    
+    def remove(self, X: Matrix, row: int) -> None:
+        self.data = X
+        self.codes = np.delete(self.codes, row, axis=0)
+        self.norms = np.delete(self.norms, row)
+        self._sort_codes()
+    
+    def _hash(self, X: Matrix) -> np.ndarray:
+        weights = np.left_shift(1, np.arange(self.n_bits, dtype=np.int64))
+        codes = np.empty((X.shape[0], self.n_tables), dtype=np.int64)
+        for start in range(0, X.shape[0], self.block_size):
+            block = X[start:start + self.block_size]
+            bits = np.asarray(block @ self.planes) > 0
+            codes[start:start + len(bits)] = (
+                bits.reshape(len(bits), self.n_tables, self.n_bits) @ weights
+            )
+        return codes
+    
+    @staticmethod
+    def _row_norms(X: Matrix) -> np.ndarray:
+        if sp.issparse(X):
+            return np.sqrt(np.asarray(X.multiply(X).sum(axis=1)).ravel())
+        return np.linalg.norm(X, axis=1)
+    
+    def _sort_codes(self) -> None:
+        self.order = np.argsort(self.codes, axis=0, kind='stable').T
+        self.sorted_codes = np.take_along_axis(self.codes, self.order.T, axis=0).T
+        self.dirty = np.empty(0, dtype=np.int64)
+    
+    def _state(self) -> Dict[str, np.ndarray]:
+        return {
+            'planes': self.planes,
+            'codes': self.codes,
+            'order': self.order,
+            'sorted_codes': self.sorted_codes,
+            'norms': self.norms,
+            'dirty': self.dirty
+        }
+    
+    def _restore(self, X: Matrix, state: Dict[str, np.ndarray]) -> None:
+        self.data = X
+        for key, array in state.items():
+            setattr(self, key, array)
+    
+    def _candidates(self, codes: np.ndarray) -> np.ndarray:
+        buckets = []
+        for table, code in enumerate(codes):
+            sorted_codes = self.sorted_codes[table]
+            lo = np.searchsorted(sorted_codes, code, side='left')
+            hi = np.searchsorted(sorted_codes, code, side='right')
+            bucket = self.order[table][lo:hi]
+            if len(self.dirty):
+                # Sorted tables are stale for dirty rows (and do not hold
+                # appended rows); check those against their current codes.
+                bucket = bucket[self.codes[bucket, table] == code]
+                bucket = np.concatenate([bucket, self.dirty[self.codes[self.dirty, table] == code]])
+            buckets.append(bucket)
+        return np.unique(np.concatenate(buckets))
+    
+    def query(self, X: Matrix, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        query_codes = self._hash(X)
+        query_norms = self._row_norms(X)
+        distances = np.empty((X.shape[0], k))
+        indices = np.empty((X.shape[0], k), dtype=np.int64)
+        
+        for row, codes in enumerate(query_codes):
+            candidates = self._candidates(codes)
+            if len(candidates) < k:
+                candidates = np.arange(self.data.shape[0])
+            
+            dots = self.data[candidates] @ X[row].T
+            dots = dots.toarray().ravel() if sp.issparse(dots) else np.ravel(dots)
+            scale = self.norms[candidates] * query_norms[row]
+            similarity = np.divide(dots, scale, out=np.zeros_like(dots, dtype=np.float64),
+                                   where=scale > 0)
+            
+            nearest = np.lexsort((candidates, -similarity))[:k]
+            indices[row] = candidates[nearest]
+            distances[row] = 1 - similarity[nearest]
+        
+        return distances, indices
+
+
+NEIGHBOR_INDEXES = {
+    BruteForceIndex.name: BruteForceIndex,
+    LSHIndex.name: LSHIndex
+}
+
+
+class RatingStats:
+    # Per-user and per-book rating counts, sums and maxima (and per-book
+    # minima) over the ratings matrix: one rating per rated (user, book),
+    # so duplicate input rows count once, at their average, and a
+    # replaced rating no longer counts. Built in one pass at load time and
+    # kept current as ratings change; a maximum or minimum that a changed
+    # rating may have held is recomputed lazily by refresh().
+    def __init__(self, matrix: sp.csr_matrix):
+        n_users, n_books = matrix.shape
+        data, starts = matrix.data, matrix.indptr[:-1]
+        self.user_count = np.diff(matrix.indptr).astype(np.int64)
+        self.user_sum = np.zeros(n_users)
+        self.user_max = np.full(n_users, -np.inf)
+        if len(data):
+            # A trailing sentinel keeps every start a valid reduceat index;
+            # empty rows are masked out
+            rated = self.user_count > 0
+            self.user_sum[rated] = np.add.reduceat(np.append(data, 0), starts)[rated]
+            self.user_max[rated] = np.maximum.reduceat(np.append(data, -np.inf), starts)[rated]
+        
+        self.book_count = np.bincount(matrix.indices, minlength=n_books).astype(np.int64)
+        self.book_sum = np.bincount(matrix.indices, weights=data, minlength=n_books)
+        self.book_max = np.full(n_books, -np.inf)
+        self.book_min = np.full(n_books, np.inf)
+        np.maximum.at(self.book_max, matrix.indices, data)
+        np.minimum.at(self.book_min, matrix.indices, data)
+        
+        self.total = int(self.user_count.sum())
+        self.total_sum = float(self.user_sum.sum())
+        self.dirty_users = set()
+        self.dirty_books = set()
+    
+    def resize(self, n_users: int, n_books: int) -> None:
+        grow_users = n_users - len(self.user_count)
+        grow_books = n_books - len(self.book_count)
+        if grow_users > 0:
+            self.user_count = np.concatenate([self.user_count, np.zeros(grow_users, dtype=np.int64)])
+            self.user_sum = np.concatenate([self.user_sum, np.zeros(grow_users)])
+            self.user_max = np.concatenate([self.user_max, np.full(grow_users, -np.inf)])
+        if grow_books > 0:
+            self.book_count = np.concatenate([self.book_count, np.zeros(grow_books, dtype=np.int64)])
+            self.book_sum = np.concatenate([self.book_sum, np.zeros(grow_books)])
+            self.book_max = np.concatenate([self.book_max, np.full(grow_books, -np.inf)])
+            self.book_min = np.concatenate([self.book_min, np.full(grow_books, np.inf)])
+    
+    def update(self, rows: np.ndarray, cols: np.ndarray, old: np.ndarray, new: np.ndarray) -> None:
+        # One entry per changed cell; 0 means "not rated"
+        removed, added = old != 0, new != 0
+        self._remove(rows[removed], cols[removed], old[removed])
+        
+        rows, cols, new = rows[added], cols[added], new[added]
+        np.add.at(self.user_count, rows, 1)
+        np.add.at(self.user_sum, rows, new)
+        np.maximum.at(self.user_max, rows, new)
+        np.add.at(self.book_count, cols, 1)
+        np.add.at(self.book_sum, cols, new)
+        np.maximum.at(self.book_max, cols, new)
+        np.minimum.at(self.book_min, cols, new)
+        self.total += len(new)
+        self.total_sum += float(new.sum())
+    
+    def remove_user(self, row: int, cols: np.ndarray, values: np.ndarray) -> None:
+        self._remove(np.full(len(cols), row), cols, values)
+        self.user_count = np.delete(self.user_count, row)
+        self.user_sum = np.delete(self.user_sum, row)
+        self.user_max = np.delete(self.user_max, row)
+        self.dirty_users = {user - (user > row) for user in self.dirty_users if user != row}
+    
+    def _remove(self, rows: np.ndarray, cols: np.ndarray, old: np.ndarray) -> None:
+        self.dirty_users.update(rows[old >= self.user_max[rows]].tolist())
+        self.dirty_books.update(cols[(old >= self.book_max[cols]) | (old <= self.book_min[cols])].tolist())
+        np.subtract.at(self.user_count, rows, 1)
+        np.subtract.at(self.user_sum, rows, old)
+        np.subtract.at(self.book_count, cols, 1)
+        np.subtract.at(self.book_sum, cols, old)
+        self.total -= len(old)
+        self.total_sum -= float(old.sum())
+    
+    def refresh(self, matrix: sp.csr_matrix) -> None:
+        for row in self.dirty_users:
+            values = matrix.data[matrix.indptr[row]:matrix.indptr[row + 1]]
+            self.user_max[row] = values.max() if len(values) else -np.inf
+        if self.dirty_books:
+            books = np.fromiter(self.dirty_books, dtype=np.int64)
+            self.book_max[books] = -np.inf
+            self.book_min[books] = np.inf
+            hits = np.isin(matrix.indices, books)
+            np.maximum.at(self.book_max, matrix.indices[hits], matrix.data[hits])
+            np.minimum.at(self.book_min, matrix.indices[hits], matrix.data[hits])
+        self.dirty_users.clear()
+        self.dirty_books.clear()
+    
+    def user(self, row: int) -> Dict:
+        count = int(self.user_count[row])
+        return {
+            'ratings': count,
+            'average_rating': self.user_sum[row] / count if count else float('nan'),
+            'max_rating': self.user_max[row] if count else float('nan')
+        }
+    
+    def book(self, col: int) -> Dict:
+        count = int(self.book_count[col])
+        return {
+            'ratings': count,
+            'average_rating': self.book_sum[col] / count if count else float('nan'),
+            'max_rating': self.book_max[col] if count else float('nan')
+        }
+    
+    def dataset(self) -> Dict:
+        rated = self.book_count > 0
+        return {
+            'users': len(self.user_count),
+            'books': len(self.book_count),
+            'ratings': self.total,
+            'min_rating': self.book_min[rated].min() if rated.any() else float('nan'),
+            'max_rating': self.book_max[rated].max() if rated.any() else float('nan'),
+            'average_rating': self.total_sum / self.total if self.total else float('nan')
+        }
+    
+    def arrays(self) -> Dict[str, np.ndarray]:
+        return {name: getattr(self, name) for name in (
+            'user_count', 'user_sum', 'user_max', 'book_count', 'book_sum', 'book_max', 'book_min'
+        )}
+    
+    @classmethod
+    def from_arrays(cls, arrays: Dict[str, np.ndarray]) -> 'RatingStats':
+        stats = cls.__new__(cls)
+        for name, array in arrays.items():
+            setattr(stats, name, np.array(array))
+        stats.total = int(stats.user_count.sum())
+        stats.total_sum = float(stats.user_sum.sum())
+        stats.dirty_users = set()
+        stats.dirty_books = set()
+        return stats
+
+
+class RecommendationCache:
+    # recommend_books results keyed by (user, n_recommendations,
+    # threshold), least recently used first. Entries expire ttl seconds
+    # after they are stored, and remember the books their scores were
+    # derived from so a change to one book's neighbourhood drops only the
+    # entries that used it.
+    def __init__(self, max_size: int, ttl: Optional[float] = None):
+        self.max_size = max_size
+        self.ttl = ttl
+        # key -> (expiry time, recommendations, books depended on)
+        self._entries: OrderedDict = OrderedDict()
+        self._by_user: Dict[str, set] = {}
+        self._by_book: Dict[str, set] = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+    
+    def __len__(self) -> int:
+        return len(self._entries)
+    
+    def get(self, key: Tuple) -> Optional[List[Tuple[str, float]]]:
+        entry = self._entries.get(key)
+        if entry is not None and self.ttl is not None and time.monotonic() >= entry[0]:
+            self._discard(key)
+            self.evictions += 1
+            entry = None
+        if entry is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return list(entry[1])
+    
+    def put(self, key: Tuple, value: List[Tuple[str, float]], books: Tuple[str, ...] = ()) -> None:
+        if self.max_size <= 0:
+            return
+        self._discard(key)
+        expires = time.monotonic() + self.ttl if self.ttl is not None else np.inf
+        self._entries[key] = (expires, list(value), books)
+        self._by_user.setdefault(key[0], set()).add(key)
+        for book in books:
+            self._by_book.setdefault(book, set()).add(key)
+        while len(self._entries) > self.max_size:
+            self._discard(next(iter(self._entries)))
+            self.evictions += 1
+    
+    def invalidate_users(self, users) -> None:
+        for user in users:
+            for key in list(self._by_user.get(user, ())):
+                self._discard(key)
+                self.invalidations += 1
+    
+    def invalidate_books(self, books) -> None:
+        for book in books:
+            for key in list(self._by_book.get(book, ())):
+                self._discard(key)
+                self.invalidations += 1
+    
+    def clear(self) -> None:
+        self._entries.clear()
+        self._by_user.clear()
+        self._by_book.clear()
+    
+    def _discard(self, key: Tuple) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        keys = self._by_user[key[0]]
+        keys.discard(key)
+        if not keys:
+            del self._by_user[key[0]]
+        for book in entry[2]:
+            keys = self._by_book[book]
+            keys.discard(key)
+            if not keys:
+                del self._by_book[book]
+    
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            'size': len(self._entries),
+            'max_size': self.max_size,
+            'ttl': self.ttl,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'evictions': self.evictions,
+            'invalidations': self.invalidations
+        }
+
+
+class BookRecommendationSystem:
+    def __init__(self, similarity_threshold: float = 3.5, sparse: bool = False,
+                 index: str = 'brute', index_params: Optional[Dict] = None,
+                 mode: str = 'user', item_neighbors: int = 20,
+                 cache_size: int = 0, cache_ttl: Optional[float] = None):
+        if index not in NEIGHBOR_INDEXES:
+            raise ValueError(f"Unknown neighbour index '{index}', expected one of {sorted(NEIGHBOR_INDEXES)}")
+        if mode not in ('user', 'item'):
+            raise ValueError(f"Unknown mode '{mode}', expected 'user' or 'item'")
+        self.similarity_threshold = similarity_threshold
+        self.sparse = sparse
+        # 'user': neighbours of the user at query time; 'item': precomputed
+        # top item_neighbors book-book neighbourhoods
+        self.mode = mode
+        self.item_neighbors = item_neighbors
+        self.item_index: Optional[Tuple[np.ndarray, np.ndarray]] = None
+        # Books x users with rows normalised for cosine similarity, and the
+        # norms they were divided by; kept current by add_ratings once built
+        self._items: Optional[sp.csr_matrix] = None
+        self._item_norms: Optional[np.ndarray] = None
+        self.index = index
+        self.index_params = index_params or {}
+        self.model: Optional[NeighborIndex] = None
+        # Users whose ratings changed since the model was last updated
+        self._model_rows = np.empty(0, dtype=np.int64)
+        self.user_book_matrix: Union[pd.DataFrame, sp.csr_matrix, None] = None
+        # Dense mode updates: the DataFrame last built by _update_dense and
+        # the (possibly larger) array it is a view of
+        self._dense_frame: Optional[pd.DataFrame] = None
+        self._dense_buffer: Optional[np.ndarray] = None
+        self.df = None
+        # Integer ID maps: label -> row/column of user_book_matrix, and back
+        self.user_ids: Dict[str, int] = {}
+        self.book_ids: Dict[str, int] = {}
+        self.user_labels: List[str] = []
+        self.book_labels: List[str] = []
+        # get_similar_users results: user -> {n_users: neighbours}, plus the
+        # lowest cached similarity per user and neighbour -> users whose
+        # cached lists contain it, for targeted invalidation
+        self._similar_cache: Dict[str, Dict[int, List[Tuple[str, float]]]] = {}
+        self._similar_worst: Dict[str, float] = {}
+        self._neighbor_of: Dict[str, set] = {}
+        # Precomputed (indices, similarities) from compute_user_neighborhoods
+        self.neighborhoods: Optional[Tuple[np.ndarray, np.ndarray]] = None
+        self.stats: Optional[RatingStats] = None
+        # recommend_books results; cache_size=0 disables caching
+        self.result_cache = RecommendationCache(cache_size, cache_ttl) if cache_size > 0 else None
+    
+    @property
+    def user_book_matrix(self) -> Union[pd.DataFrame, sp.csr_matrix, None]:
+        # Sparse mode keeps ratings for cells new to the CSR structure in
+        # _pending (row -> {col: rating}) until PENDING_MERGE_FRACTION of
+        # them build up; reading the whole matrix merges them first.
+        if self._pending_size:
+            self._merge_pending()
+        return self._user_book_matrix
+    
+    @user_book_matrix.setter
+    def user_book_matrix(self, value: Union[pd.DataFrame, sp.csr_matrix, None]) -> None:
+        self._user_book_matrix = value
+        self._pending: Dict[int, Dict[int, float]] = {}
+        # Pending cells plus existing cells cleared in place since the last merge
+        self._pending_size = 0
+    
+    def _merge_pending(self) -> None:
+        matrix = self._user_book_matrix
+        if self._pending:
+            rows, cols, ratings = [], [], []
+            for row, cells in self._pending.items():
+                rows.extend([row] * len(cells))
+                cols.extend(cells)
+                ratings.extend(cells.values())
+            matrix = matrix + sp.csr_matrix((ratings, (rows, cols)), shape=matrix.shape)
+        matrix.eliminate_zeros()
+        self.user_book_matrix = matrix
+    
+    @property
+    def df(self) -> Optional[pd.DataFrame]:
+        # The rows passed to load_data until the ratings change; after
+        # add_ratings, remove_user, load_file or load() the rows are derived
+        # from the current matrix on demand (one per rated cell).
+        if self._df is None and self.user_book_matrix is not None:
+            ratings = self._csr().tocoo()
+            self._df = pd.DataFrame({
+                'user': np.asarray(self.user_labels, dtype=object)[ratings.row],
+                'book': np.asarray(self.book_labels, dtype=object)[ratings.col],
+                'rating': ratings.data
+            })
+        return self._df
+    
+    @df.setter
+    def df(self, value: Optional[pd.DataFrame]) -> None:
+        self._df = value
+    
+    def load_data(self, data: Dict) -> None:
+        self._reset_caches()
+        self.df = pd.DataFrame(data)
+        if self.sparse:
+            self.user_book_matrix = self._build_sparse_matrix(self.df)
+        else:
+            self.user_book_matrix = self.df.pivot_table(
+                index='user', 
+                columns='book', 
+                values='rating'
+            ).fillna(0)
+            self._set_id_maps(self.user_book_matrix.index, self.user_book_matrix.columns)
+        
+        self.stats = RatingStats(self._csr())
+        self.model = NEIGHBOR_INDEXES[self.index](**self.index_params).build(self._matrix())
+        self._model_rows = np.empty(0, dtype=np.int64)
+        if self.mode == 'item':
+            self.build_item_index()
+    
+    def _build_sparse_matrix(self, df: pd.DataFrame) -> sp.csr_matrix:
+        # Same layout as the dense pivot table (sorted labels, duplicate
+        # ratings averaged) but without materialising users x books.
+        user_codes, users = pd.factorize(df['user'], sort=True)
+        book_codes, books = pd.factorize(df['book'], sort=True)
+        self._set_id_maps(users, books)
+        
+        ratings = df['rating'].to_numpy(dtype=np.float64)
+        return self._csr_from_codes(user_codes, book_codes, ratings, (len(users), len(books)))
+    
+    @staticmethod
+    def _csr_from_codes(user_codes: np.ndarray, book_codes: np.ndarray, ratings: np.ndarray,
+                        shape: Tuple[int, int]) -> sp.csr_matrix:
+        totals = sp.coo_matrix(
+            (ratings.astype(np.float64, copy=False), (user_codes, book_codes)), shape=shape
+        ).tocsr()
+        counts = sp.coo_matrix(
+            (np.ones(len(ratings), dtype=np.float32), (user_codes, book_codes)), shape=shape
+        ).tocsr()
+        totals.sum_duplicates()
+        counts.sum_duplicates()
+        totals.data /= counts.data
+        totals.eliminate_zeros()
+        return totals
+    
+    def load_file(self, path: str, user_col: str = 'user', book_col: str = 'book',
+                  rating_col: str = 'rating', chunksize: int = 1_000_000,
+                  file_format: Optional[str] = None) -> Dict[str, float]:
+        # Bulk alternative to load_data for large CSV/Parquet rating dumps.
+        # Rows are read chunksize at a time and only compact integer codes
+        # and float32 ratings are kept, so the raw table is never held in
+        # memory. Users and books are numbered in first-seen order.
+        if file_format is None:
+            file_format = 'parquet' if path.endswith(('.parquet', '.pq')) else 'csv'
+        start = time.perf_counter()
+        self._reset_caches()
+        self.user_ids, self.user_labels = {}, []
+        self.book_ids, self.book_labels = {}, []
+        
+        user_codes, book_codes, ratings = [], [], []
+        n_rows = n_dropped = 0
+        for chunk in self._read_chunks(path, file_format, [user_col, book_col, rating_col], chunksize):
+            kept = chunk.dropna()
+            n_rows += len(kept)
+            n_dropped += len(chunk) - len(kept)
+            chunk = kept
+            user_codes.append(self._ensure_ids(chunk[user_col], self.user_ids, self.user_labels))
+            book_codes.append(self._ensure_ids(chunk[book_col], self.book_ids, self.book_labels))
+            ratings.append(chunk[rating_col].to_numpy(dtype=np.float32))
+        
+        code_type = np.int32 if max(len(self.user_labels), len(self.book_labels)) < 2 ** 31 else np.int64
+        matrix = self._csr_from_codes(
+            np.concatenate(user_codes).astype(code_type) if user_codes else np.empty(0, dtype=code_type),
+            np.concatenate(book_codes).astype(code_type) if book_codes else np.empty(0, dtype=code_type),
+            np.concatenate(ratings) if ratings else np.empty(0, dtype=np.float32),
+            (len(self.user_labels), len(self.book_labels))
+        )
+        del user_codes, book_codes, ratings
+        
+        if self.sparse:
+            self.user_book_matrix = matrix
+        else:
+            self.user_book_matrix = pd.DataFrame(
+                matrix.toarray(),
+                index=pd.Index(self.user_labels, name='user'),
+                columns=pd.Index(self.book_labels, name='book')
+            )
+        self.df = None
+        self.stats = RatingStats(matrix)
+        self.model = NEIGHBOR_INDEXES[self.index](**self.index_params).build(self._matrix())
+        self._model_rows = np.empty(0, dtype=np.int64)
+        if self.mode == 'item':
+            self.build_item_index()
+        
+        seconds = time.perf_counter() - start
+        return {
+            'rows': n_rows,
+            'dropped_rows': n_dropped,
+            'users': len(self.user_labels),
+            'books': len(self.book_labels),
+            'ratings': int(matrix.nnz),
+            'seconds': seconds,
+            'rows_per_sec': n_rows / seconds if seconds > 0 else float('inf'),
+            'peak_memory_mb': self._peak_memory_mb()
+        }
+    
+    @staticmethod
+    def _read_chunks(path: str, file_format: str, columns: List[str],
+                     chunksize: int) -> Iterator[pd.DataFrame]:
+        if file_format == 'csv':
+            # Keys are read as strings so every chunk agrees on their type
+            yield from pd.read_csv(path, usecols=columns, chunksize=chunksize,
+                                   dtype={columns[0]: str, columns[1]: str})
+        elif file_format == 'parquet':
+            try:
+                import pyarrow.parquet as pq
+            except ImportError:
+                raise ImportError("Reading Parquet files requires pyarrow (pip install pyarrow).")
+            for batch in pq.ParquetFile(path).iter_batches(batch_size=chunksize, columns=columns):
+                yield batch.to_pandas()
+        else:
+            raise ValueError(f"Unknown file format '{file_format}', expected 'csv' or 'parquet'")
+    
+    @staticmethod
+    def _peak_memory_mb() -> Optional[float]:
+        if resource is None:
+            return None
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss is in bytes on macOS and kilobytes elsewhere
+        return peak / 2 ** 20 if sys.platform == 'darwin' else peak / 2 ** 10
+    
+    def add_ratings(self, data: Dict) -> None:
+        # Same input as load_data. A new rating for an already rated
+        # (user, book) replaces the old one; a rating of 0 clears it.
+        if self._user_book_matrix is None:
+            self.load_data(data)
+            return
+        
+        self.df = None
+        new = pd.DataFrame(data).drop_duplicates(['user', 'book'], keep='last')
+        rows = self._ensure_ids(new['user'], self.user_ids, self.user_labels)
+        cols = self._ensure_ids(new['book'], self.book_ids, self.book_labels)
+        ratings = new['rating'].to_numpy(dtype=np.float64)
+        
+        if self.sparse:
+            old = self._update_sparse(rows, cols, ratings)
+        else:
+            self.user_book_matrix, old = self._update_dense(rows, cols, ratings)
+        self.stats.resize(len(self.user_labels), len(self.book_labels))
+        self.stats.update(rows, cols, old, ratings)
+        
+        changed = np.unique(rows)
+        self._model_rows = np.union1d(self._model_rows, changed)
+        self._invalidate_similar(changed)
+        if self.item_index is not None:
+            self._update_item_matrix(rows, cols, ratings)
+            self._update_item_index(np.unique(cols))
+    
+    def update_rating(self, user: str, book: str, rating: float) -> None:
+        self.add_ratings({'user': [user], 'book': [book], 'rating': [rating]})
+    
+    def remove_user(self, user: str) -> bool:
+        if user not in self.user_ids:
+            return False
+        
+        self._invalidate_similar(np.array([self.user_ids[user]]), entering=False)
+        model = self._neighbor_index()
+        user_ratings = self._rated_books(user)
+        rated = np.array([self.book_ids[book] for book in user_ratings.index], dtype=np.int64)
+        row = self.user_ids.pop(user)
+        self.stats.remove_user(row, rated, user_ratings.to_numpy())
+        del self.user_labels[row]
+        for label in self.user_labels[row:]:
+            self.user_ids[label] -= 1
+        
+        if self.sparse:
+            keep = np.ones(self.user_book_matrix.shape[0], dtype=bool)
+            keep[row] = False
+            self.user_book_matrix = self.user_book_matrix[keep]
+        else:
+            self.user_book_matrix = self.user_book_matrix.drop(index=user)
+        model.remove(self._matrix(), row)
+        if self.item_index is not None:
+            self._items = None
+            self._update_item_index(rated)
+        self.df = None
+        return True
+    
+    def save(self, path: str) -> None:
+        # Versioned snapshot directory: .npy arrays (memory-mappable), JSON
+        # ID maps and settings. Everything is written to a temporary
+        # sibling directory that is then renamed into place, so neither an
+        # interrupted save nor a load running alongside one ever sees old
+        # and new files mixed (a load at the moment of the swap fails
+        # instead of reading a half-written snapshot). The new and the
+        # retired snapshot live in a uniquely named work directory, so
+        # concurrent saves and leftovers of a crashed one never collide.
+        path = os.path.normpath(path)
+        parent, name = os.path.split(path)
+        workdir = tempfile.mkdtemp(prefix=f"{name}.tmp-", dir=parent or '.')
+        staging, retired = os.path.join(workdir, 'new'), os.path.join(workdir, 'old')
+        try:
+            os.makedirs(staging)
+            self._write_snapshot(staging)
+            if os.path.exists(path):
+                os.replace(path, retired)
+                try:
+                    os.replace(staging, path)
+                except BaseException:
+                    os.replace(retired, path)
+                    raise
+            else:
+                os.replace(staging, path)
+        finally:
+            # Processes with the old arrays memory-mapped keep their pages
+            shutil.rmtree(workdir, ignore_errors=True)
+    
+    def _write_snapshot(self, path: str) -> None:
+        matrix_info = _save_matrix(path, 'ratings', self._matrix())
+        self._neighbor_index().save(os.path.join(path, 'index'), include_data=False)
+        for name, array in self.stats.arrays().items():
+            np.save(os.path.join(path, f"stats_{name}.npy"), array)
+        if self.item_index is not None:
+            np.save(os.path.join(path, 'item_indices.npy'), self.item_index[0])
+            np.save(os.path.join(path, 'item_similarities.npy'), self.item_index[1])
+        with open(os.path.join(path, 'users.json'), 'w') as f:
+            json.dump(self.user_labels, f)
+        with open(os.path.join(path, 'books.json'), 'w') as f:
+            json.dump(self.book_labels, f)
+        
+        meta = {
+            'version': SNAPSHOT_VERSION,
+            'similarity_threshold': self.similarity_threshold,
+            'sparse': self.sparse,
+            'index': self.index,
+            'index_params': self.index_params,
+            'mode': self.mode,
+            'item_neighbors': self.item_neighbors,
+            'matrix': matrix_info,
+            'item_index': self.item_index is not None
+        }
+        with open(os.path.join(path, 'meta.json'), 'w') as f:
+            json.dump(meta, f)
+    
+    @classmethod
+    def load(cls, path: str, mmap_mode: Optional[str] = 'c', cache_size: int = 0,
+             cache_ttl: Optional[float] = None) -> 'BookRecommendationSystem':
+        # Large arrays are memory-mapped: workers loading the same snapshot
+        # share its pages, and the default copy-on-write mode keeps later
+        # add_ratings calls private to each process.
+        with open(os.path.join(path, 'meta.json')) as f:
+            meta = json.load(f)
+        if meta.get('version') != SNAPSHOT_VERSION:
+            raise ValueError(
+                f"Unsupported snapshot version {meta.get('version')} at '{path}', "
+                f"expected {SNAPSHOT_VERSION}."
+            )
+        
+        system = cls(
+            similarity_threshold=meta['similarity_threshold'],
+            sparse=meta['sparse'],
+            index=meta['index'],
+            index_params=meta['index_params'],
+            mode=meta['mode'],
+            item_neighbors=meta['item_neighbors'],
+            cache_size=cache_size,
+            cache_ttl=cache_ttl
+        )
+        with open(os.path.join(path, 'users.json')) as f:
+            users = json.load(f)
+        with open(os.path.join(path, 'books.json')) as f:
+            books = json.load(f)
+        system._set_id_maps(users, books)
+        
+        matrix = _load_matrix(path, 'ratings', meta['matrix'], mmap_mode)
+        if system.sparse:
+            system.user_book_matrix = matrix
+        else:
+            system.user_book_matrix = pd.DataFrame(
+                matrix,
+                index=pd.Index(users, name='user'),
+                columns=pd.Index(books, name='book'),
+                copy=False
+            )
+        system.stats = RatingStats.from_arrays({
+            os.path.splitext(name)[0][len('stats_'):]: np.load(os.path.join(path, name))
+            for name in os.listdir(path) if name.startswith('stats_')
+        })
+        system.model = NeighborIndex.load(os.path.join(path, 'index'), X=system._matrix(),
+                                          mmap_mode=mmap_mode)
+        if meta['item_index']:
+            system.item_index = (
+                np.load(os.path.join(path, 'item_indices.npy'), mmap_mode=mmap_mode),
+                np.load(os.path.join(path, 'item_similarities.npy'), mmap_mode=mmap_mode)
+            )
+        return system
+    
+    @staticmethod
+    def _ensure_ids(labels: pd.Series, ids: Dict[str, int], names: List[str]) -> np.ndarray:
+        # Integer codes for labels, registering unseen ones; only the
+        # distinct labels go through Python
+        codes, uniques = pd.factorize(labels)
+        mapping = np.empty(len(uniques), dtype=np.int64)
+        for i, label in enumerate(uniques):
+            if label not in ids:
+                ids[label] = len(names)
+                names.append(label)
+            mapping[i] = ids[label]
+        return mapping[codes]
+    
+    def _update_sparse(self, rows: np.ndarray, cols: np.ndarray,
+                       ratings: np.ndarray) -> np.ndarray:
+        # Returns the previous value of each cell.
+        # Existing cells are overwritten in place (a cleared one stays as an
+        # explicit zero); cells new to the sparsity structure go to
+        # _pending, and both are folded in by one linear merge once they
+        # reach PENDING_MERGE_FRACTION of the stored cells.
+        matrix = self._user_book_matrix
+        shape = (len(self.user_labels), len(self.book_labels))
+        if matrix.shape != shape:
+            matrix.resize(shape)
+        if not matrix.data.flags.writeable:
+            matrix.data = np.array(matrix.data)
+        
+        indptr, indices = matrix.indptr, matrix.indices
+        old = np.zeros(len(rows))
+        for i, (row, col, rating) in enumerate(zip(rows.tolist(), cols.tolist(), ratings.tolist())):
+            lo, hi = indptr[row], indptr[row + 1]
+            pos = lo + np.searchsorted(indices[lo:hi], col)
+            if pos < hi and indices[pos] == col:
+                old[i] = matrix.data[pos]
+                matrix.data[pos] = rating
+                self._pending_size += rating == 0
+                continue
+            cells = self._pending.setdefault(row, {})
+            old[i] = cells.pop(col, 0)
+            if rating:
+                cells[col] = rating
+                self._pending_size += 1
+            elif not cells:
+                del self._pending[row]
+        
+        if self._pending_size > PENDING_MERGE_FRACTION * matrix.nnz:
+            self._merge_pending()
+        return old
+    
+    def _update_dense(self, rows: np.ndarray, cols: np.ndarray,
+                      ratings: np.ndarray) -> Tuple[pd.DataFrame, np.ndarray]:
+        # The matrix is a view of a larger zero-padded buffer: ratings are
+        # written in place, and the buffer is only reallocated (doubling the
+        # outgrown axis) when new users or books no longer fit. A matrix
+        # that did not come from here (load_data, load, remove_user) is
+        # copied into a fresh buffer once.
+        frame = self.user_book_matrix
+        buffer = self._dense_buffer
+        shape = (len(self.user_labels), len(self.book_labels))
+        if frame is not self._dense_frame or buffer is None:
+            buffer = frame.to_numpy(dtype=np.float64, copy=True)
+        if shape[0] > buffer.shape[0] or shape[1] > buffer.shape[1]:
+            grown = np.zeros((
+                max(shape[0], 2 * buffer.shape[0]) if shape[0] > buffer.shape[0] else buffer.shape[0],
+                max(shape[1], 2 * buffer.shape[1]) if shape[1] > buffer.shape[1] else buffer.shape[1]
+            ))
+            grown[:frame.shape[0], :frame.shape[1]] = buffer[:frame.shape[0], :frame.shape[1]]
+            buffer = grown
+        
+        old = buffer[rows, cols]
+        buffer[rows, cols] = ratings
+        if buffer is not self._dense_buffer or frame.shape != shape:
+            frame = pd.DataFrame(
+                buffer[:shape[0], :shape[1]],
+                index=pd.Index(self.user_labels, name='user'),
+                columns=pd.Index(self.book_labels, name='book'),
+                copy=False
+            )
+        self._dense_frame, self._dense_buffer = frame, buffer
+        return frame, old
+    
+    def _item_matrix(self) -> sp.csr_matrix:
+        if self._items is None:
+            self._items, self._item_norms = self._normalize_rows(self._csr().T.tocsr())
+        return self._items
+    
+    @staticmethod
+    def _normalize_rows(X: sp.csr_matrix) -> Tuple[sp.csr_matrix, np.ndarray]:
+        return normalize(X), np.sqrt(np.asarray(X.multiply(X).sum(axis=1)).ravel())
+    
+    def _update_item_matrix(self, rows: np.ndarray, cols: np.ndarray, ratings: np.ndarray) -> None:
+        # Rebuild only the rows of the changed books: recover their ratings
+        # from the stored norms, apply the new cells and renormalise.
+        # One entry per changed (user, book) cell; 0 clears it.
+        if self._items is None or not len(cols):
+            return
+        items = self._items
+        shape = (len(self.book_labels), len(self.user_labels))
+        if items.shape != shape:
+            items.resize(shape)
+            self._item_norms = np.concatenate([self._item_norms, np.zeros(shape[0] - len(self._item_norms))])
+        
+        books, positions = np.unique(cols, return_inverse=True)
+        starts, stops = items.indptr[books], items.indptr[books + 1]
+        slots = np.concatenate([np.arange(start, stop) for start, stop in zip(starts, stops)])
+        current_rows = np.repeat(np.arange(len(books)), stops - starts)
+        current_cols = items.indices[slots]
+        values = items.data[slots] * self._item_norms[books][current_rows]
+        kept = ~np.isin(current_rows * shape[1] + current_cols, positions * shape[1] + rows)
+        rated = ratings != 0
+        block = sp.csr_matrix((
+            np.concatenate([values[kept], ratings[rated]]),
+            (np.concatenate([current_rows[kept], positions[rated]]),
+             np.concatenate([current_cols[kept], rows[rated]]))
+        ), shape=(len(books), shape[1]))
+        block, self._item_norms[books] = self._normalize_rows(block)
+        
+        same_cells = (np.array_equal(block.indptr[1:], np.cumsum(stops - starts))
+                      and np.array_equal(block.indices, current_cols))
+        if same_cells:
+            # Only existing cells changed: overwrite them in place
+            items.data[slots] = block.data
+            return
+        # Otherwise splice the new rows in, copying the others unchanged
+        counts = np.diff(items.indptr)
+        replaced = np.zeros(shape[0], dtype=bool)
+        replaced[books] = True
+        keep = np.repeat(~replaced, counts)
+        counts[books] = np.diff(block.indptr)
+        indptr = np.concatenate([[0], np.cumsum(counts)])
+        fill = np.repeat(replaced, counts)
+        indices = np.empty(indptr[-1], dtype=np.int64)
+        data = np.empty(indptr[-1])
+        indices[~fill], data[~fill] = items.indices[keep], items.data[keep]
+        indices[fill], data[fill] = block.indices, block.data
+        self._items = sp.csr_matrix((data, indices, indptr), shape=shape)
+    
+    def build_item_index(self, block_size: int = 1024, n_jobs: int = 1) -> None:
+        self.item_index = top_k_neighborhoods(
+            self._csr().T.tocsr(), self.item_neighbors, block_size, n_jobs
+        )
+        self._items = None
+        if self.result_cache is not None:
+            self.result_cache.clear()
+    
+    def _update_item_index(self, books: np.ndarray, block_size: int = 1024) -> None:
+        # Recompute only the neighbourhoods the changed books can affect:
+        # their own, those that contain them, and those they now beat the
+        # weakest entry of. Similarity is symmetric, so one product of the
+        # changed rows against all books covers both directions.
+        indices, similarities = self.item_index
+        items = self._item_matrix()
+        n_books = items.shape[0]
+        top_k = min(self.item_neighbors, n_books - 1)
+        if top_k != indices.shape[1]:
+            self.build_item_index()
+            return
+        if not indices.flags.writeable:
+            indices, similarities = np.array(indices), np.array(similarities)
+        if n_books > len(indices):
+            extra = n_books - len(indices)
+            indices = np.vstack([indices, np.zeros((extra, top_k), dtype=np.int64)])
+            similarities = np.vstack([similarities, np.full((extra, top_k), -np.inf)])
+        
+        changed = (items @ items[books].T).toarray().T
+        changed[np.arange(len(books)), books] = -np.inf
+        worst = similarities[:, -1] if top_k else np.full(n_books, np.inf)
+        stale = (changed >= worst).any(axis=0) | np.isin(indices, books).any(axis=1)
+        stale[books] = True
+        
+        rows = np.flatnonzero(stale)
+        for start in range(0, len(rows), block_size):
+            block = rows[start:start + block_size]
+            indices[block], similarities[block] = _top_k_rows(items, block, top_k)
+        self.item_index = (indices, similarities)
+        if self.result_cache is not None:
+            self.result_cache.invalidate_books(self.book_labels[row] for row in rows)
+    
+    def _item_recommendations(self, user_ratings: pd.Series) -> Tuple[Dict[str, float], List[str]]:
+        # Score candidates from the neighbourhoods of the books this user
+        # rated at least similarity_threshold: O(books read x item_neighbors)
+        indices, similarities = self.item_index
+        seeds = self._seed_books(user_ratings)
+        recommendations = {}
+        for book in seeds:
+            rating = user_ratings[book]
+            row = self.book_ids[book]
+            for neighbor, similarity in zip(indices[row], similarities[row]):
+                candidate = self.book_labels[neighbor]
+                if similarity > 0 and candidate not in user_ratings.index:
+                    recommendations[candidate] = recommendations.get(candidate, 0) + rating * similarity
+        return recommendations, seeds
+    
+    def _seed_books(self, user_ratings: pd.Series) -> List[str]:
+        return [book for book, rating in user_ratings.items()
+                if rating >= self.similarity_threshold]
+    
+    def _reset_caches(self) -> None:
+        self.neighborhoods = None
+        self._similar_cache.clear()
+        self._similar_worst.clear()
+        self._neighbor_of.clear()
+        if self.result_cache is not None:
+            self.result_cache.clear()
+    
+    def cache_stats(self) -> Optional[Dict]:
+        if self.result_cache is None:
+            return None
+        return self.result_cache.stats()
+    
+    def _cache_similar(self, user: str, n_users: int,
+                       similar_users: List[Tuple[str, float]]) -> None:
+        self._similar_cache.setdefault(user, {})[n_users] = similar_users
+        # A list that is not full can gain any user
+        worst = similar_users[-1][1] if len(similar_users) == n_users else -np.inf
+        self._similar_worst[user] = min(worst, self._similar_worst.get(user, np.inf))
+        for neighbor, _ in similar_users:
+            self._neighbor_of.setdefault(neighbor, set()).add(user)
+    
+    def _drop_similar(self, user: str) -> None:
+        for similar_users in self._similar_cache.pop(user, {}).values():
+            for neighbor, _ in similar_users:
+                self._neighbor_of.get(neighbor, set()).discard(user)
+        self._similar_worst.pop(user, None)
+    
+    def _invalidate_similar(self, rows: np.ndarray, entering: bool = True,
+                            block_size: int = 4096) -> None:
+        # Drop cached neighbour lists that a change to these users' ratings
+        # can affect: their own, lists they appear in, and (if entering)
+        # lists they may now enter because their similarity beats the
+        # list's weakest entry. Cached recommendations of every user whose
+        # list is dropped go with it. With an approximate index any list
+        # may change (a row moving buckets, or a query falling back to
+        # brute force when its buckets run short), so all of them go.
+        self.neighborhoods = None
+        changed = [self.user_labels[row] for row in rows]
+        if self.result_cache is not None:
+            self.result_cache.invalidate_users(changed)
+        if not self._similar_cache:
+            return
+        stale = set(changed)
+        for user in changed:
+            stale.update(self._neighbor_of.pop(user, ()))
+        if not self.model.exact:
+            stale.update(self._similar_cache)
+        
+        cached = [user for user in self._similar_cache if user not in stale] if entering else []
+        changed_rows = self._user_rows(rows) if cached else None
+        for start in range(0, len(cached), block_size):
+            block = cached[start:start + block_size]
+            similarity = cosine_similarity(
+                changed_rows, self._user_rows([self.user_ids[user] for user in block])
+            )
+            worst = np.array([self._similar_worst[user] for user in block])
+            enters = (similarity >= worst).any(axis=0)
+            stale.update(user for user, enter in zip(block, enters) if enter)
+        
+        for user in stale:
+            self._drop_similar(user)
+        if self.result_cache is not None:
+            self.result_cache.invalidate_users(stale)
+    
+    def _set_id_maps(self, users, books) -> None:
+        self.user_labels = list(users)
+        self.book_labels = list(books)
+        self.user_ids = {user: i for i, user in enumerate(self.user_labels)}
+        self.book_ids = {book: i for i, book in enumerate(self.book_labels)}
+    
+    def _matrix(self) -> Matrix:
+        if self.sparse:
+            return self.user_book_matrix
+        return self.user_book_matrix.values
+    
+    def _user_vector(self, user_index: int) -> Matrix:
+        return self._matrix()[user_index:user_index + 1]
+    
+    def _user_rows(self, rows) -> Matrix:
+        # The given rows of the ratings matrix, reading pending sparse cells
+        # through instead of merging them
+        if not self.sparse:
+            return self._matrix()[rows]
+        block = self._user_book_matrix[rows]
+        pending = [(i, col, rating) for i, row in enumerate(rows)
+                   for col, rating in self._pending.get(row, {}).items()]
+        if pending:
+            positions, cols, ratings = zip(*pending)
+            block = block + sp.csr_matrix((ratings, (positions, cols)), shape=block.shape)
+        return block
+    
+    def _neighbor_index(self) -> NeighborIndex:
+        # add_ratings defers model updates so a burst of them shares one
+        # (and one merge of pending cells); apply them before a query
+        if len(self._model_rows):
+            rows, self._model_rows = self._model_rows, np.empty(0, dtype=np.int64)
+            self.model.update(self._matrix(), rows)
+        return self.model
+    
+    def _rated_books(self, user: str) -> pd.Series:
+        # Non-zero ratings of one user, indexed by book, in column order
+        user_index = self.user_ids[user]
+        if self.sparse:
+            row = self._user_rows([user_index])
+            rated = row.data != 0
+            return pd.Series(
+                row.data[rated],
+                index=[self.book_labels[i] for i in row.indices[rated]],
+                dtype=np.float64
+            )
+        user_ratings = self.user_book_matrix.iloc[user_index]
+        return user_ratings[user_ratings > 0]
+    
+    def get_user_similarity_matrix(self, top_k: Optional[int] = None, block_size: int = 1024,
+                                   n_jobs: int = 1) -> Union[pd.DataFrame, sp.csr_matrix]:
+        if top_k is not None:
+            # Chunked mode: only the top_k most similar users per row,
+            # computed block_size rows at a time across n_jobs processes
+            indices, similarities = top_k_neighborhoods(self._matrix(), top_k, block_size, n_jobs)
+            n_users = len(self.user_labels)
+            return sp.csr_matrix(
+                (similarities.ravel(), indices.ravel(),
+                 np.arange(n_users + 1) * indices.shape[1]),
+                shape=(n_users, n_users)
+            )
+        if self.sparse:
+            # Rows and columns follow user_labels
+            return cosine_similarity(self.user_book_matrix, dense_output=False)
+        similarity_matrix = cosine_similarity(self.user_book_matrix)
+        return pd.DataFrame(
+            similarity_matrix,
+            index=self.user_book_matrix.index,
+            columns=self.user_book_matrix.index
+        )
+    
+    def compute_user_neighborhoods(self, top_k: int = 10, block_size: int = 1024, n_jobs: int = 1,
+                                   path: Optional[str] = None) -> Tuple[np.ndarray, np.ndarray]:
+        # Precompute top_k neighbours for every user. get_similar_users
+        # serves from them until the ratings change. With path the arrays
+        # are written to disk as they are computed, together with the
+        # user labels, for load_user_neighborhoods.
+        self.neighborhoods = top_k_neighborhoods(self._matrix(), top_k, block_size, n_jobs, path)
+        if path is not None:
+            with open(os.path.join(path, 'users.json'), 'w') as f:
+                json.dump(self.user_labels, f)
+        return self.neighborhoods
+    
+    def load_user_neighborhoods(self, path: str) -> None:
+        with open(os.path.join(path, 'users.json')) as f:
+            users = json.load(f)
+        if users != self.user_labels:
+            raise ValueError(f"Neighbourhoods at '{path}' were built for a different set of users.")
+        self.neighborhoods = (
+            np.load(os.path.join(path, 'indices.npy'), mmap_mode='r'),
+            np.load(os.path.join(path, 'similarities.npy'), mmap_mode='r')
+        )
+    
+    def get_similar_users(self, user: str, n_users: int = 3) -> List[Tuple[str, float]]:
+        if user not in self.user_ids:
+            return []
+        
+        cached = self._similar_cache.get(user, {}).get(n_users)
+        if cached is not None:
+            return list(cached)
+        if self.neighborhoods is not None and n_users <= self.neighborhoods[0].shape[1]:
+            indices, similarities = self.neighborhoods
+            row = self.user_ids[user]
+            similar_users = [(self.user_labels[i], similarities[row, j])
+                             for j, i in enumerate(indices[row, :n_users])]
+            self._cache_similar(user, n_users, similar_users)
+            return list(similar_users)
+        
+        user_index = self.user_ids[user]
+        distances, indices = self._neighbor_index().query(
+            self._user_vector(user_index),
+            min(n_users + 1, len(self.user_labels))
+        )
+        
+        similar_users = []
+        for i, idx in enumerate(indices.flatten()[1:]):
+            similar_user = self.user_labels[idx]
+            similarity = 1 - distances.flatten()[i + 1]
+            similar_users.append((similar_user, similarity))
+        
+        self._cache_similar(user, n_users, similar_users)
+        return list(similar_users)
+    
+    def evaluate_index(self, k: int = 10, n_queries: int = 1000) -> Dict[str, float]:
+        return self._neighbor_index().recall_at_k(self._matrix(), k=k, n_queries=n_queries)
+    
+    def recommend_books(self, user: str, n_recommendations: int = 3, 
+                       show_details: bool = True) -> Optional[List[Tuple[str, float]]]:
+        if user not in self.user_ids:
+            if show_details:
+                print(f"  User '{user}' not found in dataset.")
+                self._show_available_users()
+            return None
+        
+        key = (user, n_recommendations, self.similarity_threshold)
+        cached = self.result_cache.get(key) if self.result_cache is not None else None
+        if cached is not None and not show_details:
+            return cached
+        
+        user_ratings = self._rated_books(user)
+        read_books = user_ratings.index.tolist()
+        
+        if show_details:
+            print(f"\n User: {user}")
+            print(f" Books already rated: {', '.join(read_books)}")
+        
+        if cached is not None:
+            # A cached list goes whenever the neighbours or seed books it
+            # was scored from change, so those are still current to show
+            if self.mode == 'item':
+                self._display_seeds(self._seed_books(user_ratings))
+            else:
+                self._display_similar_users(self.get_similar_users(user, n_users=3))
+            self._display_recommendations(user, cached, n_recommendations)
+            return cached
+        
+        seeds = []
+        if self.mode == 'item':
+            recommendations, seeds = self._item_recommendations(user_ratings)
+            if show_details:
+                self._display_seeds(seeds)
+        else:
+            recommendations = self._user_recommendations(user, user_ratings, show_details)
+        
+        recommended_books = sorted(
+            recommendations.items(), 
+            key=lambda x: x[1], 
+            reverse=True
+        )[:n_recommendations]
+        if self.result_cache is not None:
+            # User mode results are dropped with the user's cached neighbour
+            # list; item mode results with any seed book's neighbourhood
+            self.result_cache.put(key, recommended_books, tuple(seeds))
+        
+        if show_details:
+            self._display_recommendations(user, recommended_books, n_recommendations)
+        
+        return recommended_books
+    
+    def recommend_books_batch(self, users: List[str], n_recommendations: int = 3,
+                              n_users: int = 3, batch_size: int = 1024) -> pd.DataFrame:
+        # Vectorised recommend_books for many users: one neighbour query and
+        # one scoring pass per block of users. Returns one row per
+        # recommendation (user, rank, book, score), ranked exactly as
+        # recommend_books ranks them. Unknown users are skipped.
+        if self.mode == 'item':
+            # Item mode is already O(books read x item_neighbors) per user
+            frames = []
+            for user in users:
+                recommended = self.recommend_books(user, n_recommendations, show_details=False) or []
+                frames.append(pd.DataFrame({
+                    'user': [user] * len(recommended),
+                    'rank': np.arange(1, len(recommended) + 1),
+                    'book': [book for book, _ in recommended],
+                    'score': [score for _, score in recommended]
+                }))
+            return pd.concat(frames, ignore_index=True) if frames else self._empty_recommendations()
+        
+        rows = np.array([self.user_ids[user] for user in users if user in self.user_ids],
+                        dtype=np.int64)
+        ratings = self._csr()
+        liked = ratings.copy()
+        liked.data[liked.data < self.similarity_threshold] = 0
+        liked.eliminate_zeros()
+        
+        frames = []
+        for start in range(0, len(rows), batch_size):
+            block = rows[start:start + batch_size]
+            frames.append(self._score_block(block, ratings, liked, n_recommendations, n_users))
+        
+        if not frames:
+            return self._empty_recommendations()
+        return pd.concat(frames, ignore_index=True)
+    
+    @staticmethod
+    def _empty_recommendations() -> pd.DataFrame:
+        return pd.DataFrame({'user': [], 'rank': [], 'book': [], 'score': []})
+    
+    def _csr(self) -> sp.csr_matrix:
+        if self.sparse:
+            return self.user_book_matrix
+        return sp.csr_matrix(self.user_book_matrix.values)
+    
+    def _score_block(self, block: np.ndarray, ratings: sp.csr_matrix, liked: sp.csr_matrix,
+                     n_recommendations: int, n_users: int) -> pd.DataFrame:
+        n_books = ratings.shape[1]
+        distances, indices = self._neighbor_index().query(
+            self._matrix()[block],
+            min(n_users + 1, len(self.user_labels))
+        )
+        neighbours = indices[:, 1:]
+        similarities = 1 - distances[:, 1:]
+        
+        # (row, book, weighted score, neighbour rank) for every liked book of
+        # every neighbour, concatenated in neighbour order
+        rows, books, scores, ranks = [], [], [], []
+        for j in range(neighbours.shape[1]):
+            part = liked[neighbours[:, j]]
+            counts = np.diff(part.indptr)
+            rows.append(np.repeat(np.arange(len(block)), counts))
+            books.append(part.indices)
+            scores.append(part.data * np.repeat(similarities[:, j], counts))
+            ranks.append(np.full(len(part.indices), j))
+        if sum(len(part) for part in books) == 0:
+            return self._empty_recommendations()
+        rows, books = np.concatenate(rows), np.concatenate(books)
+        scores, ranks = np.concatenate(scores), np.concatenate(ranks)
+        
+        # Group by (row, book); lexsort is stable so each group stays in
+        # neighbour order and is summed in the same order as recommend_books.
+        order = np.lexsort((books, rows))
+        keys = rows[order] * n_books + books[order]
+        starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+        lengths = np.diff(np.r_[starts, len(keys)])
+        total = scores[order][starts]
+        for offset in range(1, lengths.max(initial=1)):
+            more = lengths > offset
+            total[more] += scores[order][starts[more] + offset]
+        group_keys = keys[starts]
+        first_rank = ranks[order][starts]
+        
+        # Drop books the user has already rated
+        own = ratings[block]
+        own_keys = np.repeat(np.arange(len(block)), np.diff(own.indptr)) * n_books + own.indices
+        unread = ~np.isin(group_keys, own_keys)
+        group_keys, total, first_rank = group_keys[unread], total[unread], first_rank[unread]
+        group_rows, group_books = group_keys // n_books, group_keys % n_books
+        
+        # Highest score first; ties keep recommend_books' insertion order
+        order = np.lexsort((group_books, first_rank, -total, group_rows))
+        group_rows, group_books, total = group_rows[order], group_books[order], total[order]
+        rank = np.arange(len(group_rows)) - np.searchsorted(group_rows, group_rows)
+        keep = rank < n_recommendations
+        
+        return pd.DataFrame({
+            'user': [self.user_labels[block[i]] for i in group_rows[keep]],
+            'rank': rank[keep] + 1,
+            'book': [self.book_labels[i] for i in group_books[keep]],
+            'score': total[keep]
+        })
+    
+    def _user_recommendations(self, user: str, user_ratings: pd.Series,
+                              show_details: bool) -> Dict[str, float]:
+        similar_users = self.get_similar_users(user, n_users=3)
+        
+        if show_details:
+            self._display_similar_users(similar_users)
+        
+        recommendations = {}
+        for sim_user, user_similarity in similar_users:
+            sim_user_ratings = self._rated_books(sim_user)
+            
+            for book, rating in sim_user_ratings.items():
+                if rating >= self.similarity_threshold and book not in user_ratings.index:
+                    weighted_score = rating * user_similarity
+                    recommendations[book] = recommendations.get(book, 0) + weighted_score
+        return recommendations
+    
+    @staticmethod
+    def _display_similar_users(similar_users: List[Tuple[str, float]]) -> None:
+        print(f" Most similar users:")
+        for sim_user, similarity in similar_users:
+            print(f"   - {sim_user} (similarity: {similarity:.3f})")
+    
+    @staticmethod
+    def _display_seeds(seeds: List[str]) -> None:
+        print(f" Based on: {', '.join(seeds) if seeds else 'no highly rated books'}")
+    
+    def _display_recommendations(self, user: str, recommendations: List[Tuple[str, float]], 
+                               n_recommendations: int) -> None:
+        print(f"\n Top {n_recommendations} Book Recommendations for {user}:")
+        if recommendations:
+            for i, (book, score) in enumerate(recommendations, 1):
+                print(f"   {i}. {book} (score: {score:.2f})")
+        else:
+            print("   No new recommendations available based on current data.")
+    
+    def _show_available_users(self) -> None:
+        users = self.user_labels
+        print(f"Available users: {', '.join(users)}")
+    
+    def get_user_stats(self, user: str) -> Optional[Dict]:
+        if user not in self.user_ids:
+            return None
+        
+        stats = self._stats().user(self.user_ids[user])
+        rated_books = self._rated_books(user)
+        
+        return {
+            'total_books_rated': stats['ratings'],
+            'average_rating': stats['average_rating'],
+            'favorite_books': rated_books[rated_books == stats['max_rating']].index.tolist(),
+            'books_rated': dict(rated_books)
+        }
+    
+    def _stats(self) -> RatingStats:
+        if self.stats.dirty_users or self.stats.dirty_books:
+            self.stats.refresh(self._csr())
+        return self.stats
+    
+    def get_stats_json(self, user: Optional[str] = None, book: Optional[str] = None) -> Optional[str]:
+        # Dataset, user or book statistics as JSON; None for unknown keys
+        if user is not None:
+            if user not in self.user_ids:
+                return None
+            stats = {'user': user, **self._stats().user(self.user_ids[user])}
+        elif book is not None:
+            if book not in self.book_ids:
+                return None
+            stats = {'book': book, **self._stats().book(self.book_ids[book])}
+        else:
+            stats = self._stats().dataset()
+        return json.dumps({
+            key: value.item() if isinstance(value, np.generic) else value
+            for key, value in stats.items()
+        })
+    
+    def display_dataset_overview(self) -> None:
+        # Counts and averages are over rated (user, book) cells, not input
+        # rows; see RatingStats
+        stats = self._stats()
+        dataset = stats.dataset()
+        print("=" * 50)
+        print("DATASET OVERVIEW")
+        print("=" * 50)
+        print(f"Total users: {dataset['users']}")
+        print(f"Total books: {dataset['books']}")
+        print(f"Total ratings: {dataset['ratings']}")
+        print(f"Rating range: {dataset['min_rating']} - {dataset['max_rating']}")
+        print(f"Average rating: {dataset['average_rating']:.2f}")
+        
+        print(f"\n Books in dataset:")
+        for col, book in enumerate(self.book_labels):
+            book_stats = stats.book(col)
+            print(f"   - {book} (avg: {book_stats['average_rating']:.1f}, {book_stats['ratings']} ratings)")
+
+# ==================== MAIN EXECUTION ====================
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        # Bulk load: python recomendationsystem.py ratings.csv|ratings.parquet
+        recommender = BookRecommendationSystem(similarity_threshold=3.5, sparse=True, cache_size=1024)
+        stats = recommender.load_file(sys.argv[1])
+        print(f"Loaded {stats['rows']} rows in {stats['seconds']:.1f}s "
+              f"({stats['rows_per_sec']:.0f} rows/s, peak memory {stats['peak_memory_mb']} MB)")
+        if stats['dropped_rows']:
+            print(f"Skipped {stats['dropped_rows']} rows with missing values")
+    else:
+        recommender = BookRecommendationSystem(similarity_threshold=3.5, cache_size=1024)
+
+        # Collect data at runtime
+        users, books, ratings = [], [], []
+        print("Enter book ratings data. Type 'done' to finish.")
+        while True:
+            user = input("Enter user name (or 'done' to stop): ").strip()
+            if user.lower() == 'done':
+                break
+            book = input("Enter book title: ").strip()
+            try:
+                rating = float(input("Enter rating (1-5): ").strip())
+            except ValueError:
+                print("Invalid rating. Skipping...")
+                continue
+            users.append(user)
+            books.append(book)
+            ratings.append(rating)
+
+        data = {'user': users, 'book': books, 'rating': ratings}
+
+        recommender.load_data(data)
+    recommender.display_dataset_overview()
+
+    while True:
+        query_user = input("\nEnter user name for recommendations (or 'exit' to quit): ").strip()
+        if query_user.lower() == 'exit':
+            break
         recommender.recommend_books(query_user, n_recommendations=3)
\ No newline at end of file
@@ -0,0 +1,27 @@
+import time
+
+import pytest
+
+from chatbot import EnhancedRuleBot
+
+
+@pytest.mark.parametrize("text", [
+    " " * 30000 + "x",
+    "+" * 30000 + "x",
+    "(" * 30000 + "x",
+    " +(-" * 7500 + "x",
+    "1" + "+ " * 15000 + "x",
+    "1" + " )" * 15000 + "x",
+])
+def test_long_hostile_input_returns_quickly(text):
+    bot = EnhancedRuleBot()
+    start = time.perf_counter()
+    bot.chatbot_response(text)
+    assert time.perf_counter() - start < 1.0
+
+
+def test_math_still_found_in_text():
+    bot = EnhancedRuleBot()
+    assert bot.calculate_simple_math("what is 2+3") == "2 + 3 = 5"
+    assert bot.calculate_simple_math("7*8 12") == "7 * 8 = 56"
+    assert bot.calculate_simple_math("calc (1+2)*3 please") == "(1 + 2) * 3 = 9"
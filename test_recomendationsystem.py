@@ -0,0 +1,160 @@
+import os
+
+import numpy as np
+import pytest
+
+import recomendationsystem
+from recomendationsystem import BookRecommendationSystem, top_k_neighborhoods
+
+
+def _ratings(n_users, n_books, n, seed):
+    rng = np.random.default_rng(seed)
+    return {
+        'user': [f"u{i}" for i in rng.integers(0, n_users, n)],
+        'book': [f"b{i}" for i in rng.integers(0, n_books, n)],
+        'rating': rng.integers(1, 6, n).astype(float).tolist()
+    }
+
+
+def _cells(recommender):
+    # {(user, book): rating} read from the whole matrix
+    matrix = recommender._csr().tocoo()
+    return {
+        (recommender.user_labels[row], recommender.book_labels[col]): rating
+        for row, col, rating in zip(matrix.row, matrix.col, matrix.data)
+    }
+
+
+@pytest.mark.parametrize("sparse", [False, True])
+@pytest.mark.parametrize("merge_fraction", [0.0, 1 / 16, 10.0])
+def test_incremental_updates_match_full_rebuild(monkeypatch, sparse, merge_fraction):
+    monkeypatch.setattr(recomendationsystem, 'PENDING_MERGE_FRACTION', merge_fraction)
+    data = _ratings(40, 30, 400, seed=0)
+    recommender = BookRecommendationSystem(sparse=sparse)
+    recommender.load_data(data)
+    state = {}
+    for user, book, rating in zip(data['user'], data['book'], data['rating']):
+        state.setdefault((user, book), []).append(rating)
+    state = {cell: sum(ratings) / len(ratings) for cell, ratings in state.items()}
+
+    rng = np.random.default_rng(1)
+    for step in range(20):
+        # Overwrites, clears (rating 0), new cells, new users and new books
+        n = int(rng.integers(1, 15))
+        batch = {
+            'user': [f"u{i}" for i in rng.integers(0, 45, n)],
+            'book': [f"b{i}" for i in rng.integers(0, 35, n)],
+            'rating': rng.integers(0, 6, n).astype(float).tolist()
+        }
+        recommender.add_ratings(batch)
+        for user, book, rating in zip(batch['user'], batch['book'], batch['rating']):
+            if rating:
+                state[(user, book)] = rating
+            else:
+                state.pop((user, book), None)
+        if step % 5 == 4:
+            user = recommender.user_labels[int(rng.integers(len(recommender.user_labels)))]
+            recommender.remove_user(user)
+            state = {cell: rating for cell, rating in state.items() if cell[0] != user}
+
+        reference = BookRecommendationSystem(sparse=sparse)
+        reference.load_data({
+            'user': [user for user, _ in state],
+            'book': [book for _, book in state],
+            'rating': list(state.values())
+        })
+        for user in reference.user_labels:
+            assert dict(recommender._rated_books(user)) == dict(reference._rated_books(user))
+            stats, expected_stats = recommender.get_user_stats(user), reference.get_user_stats(user)
+            assert stats['total_books_rated'] == expected_stats['total_books_rated']
+            assert stats['average_rating'] == pytest.approx(expected_stats['average_rating'])
+            assert set(stats['favorite_books']) == set(expected_stats['favorite_books'])
+        for user in reference.user_labels[step::5]:
+            similar = recommender.get_similar_users(user, n_users=3)
+            expected = reference.get_similar_users(user, n_users=3)
+            assert np.allclose([s for _, s in similar], [s for _, s in expected])
+        dataset, expected_dataset = recommender._stats().dataset(), reference._stats().dataset()
+        for key in ('ratings', 'min_rating', 'max_rating', 'average_rating'):
+            assert dataset[key] == pytest.approx(expected_dataset[key])
+
+    assert {cell: rating for cell, rating in _cells(recommender).items() if rating} == state
+    rows = recommender.df
+    assert dict(zip(zip(rows['user'], rows['book']), rows['rating'])) == state
+
+
+@pytest.mark.parametrize("sparse", [False, True])
+def test_incremental_item_index_matches_rebuild(sparse):
+    recommender = BookRecommendationSystem(sparse=sparse, mode='item', item_neighbors=5)
+    recommender.load_data(_ratings(60, 25, 500, seed=2))
+    rng = np.random.default_rng(3)
+    for step in range(15):
+        n = int(rng.integers(1, 10))
+        recommender.add_ratings({
+            'user': [f"u{i}" for i in rng.integers(0, 65, n)],
+            'book': [f"b{i}" for i in rng.integers(0, 28, n)],
+            'rating': rng.integers(0, 6, n).astype(float).tolist()
+        })
+        if step % 5 == 4:
+            recommender.remove_user(recommender.user_labels[int(rng.integers(len(recommender.user_labels)))])
+
+        reference = BookRecommendationSystem(sparse=sparse, mode='item', item_neighbors=5)
+        reference.load_data(recommender.df)
+        for book in reference.book_labels:
+            assert np.allclose(recommender.item_index[1][recommender.book_ids[book]],
+                               reference.item_index[1][reference.book_ids[book]])
+
+
+@pytest.mark.parametrize("index", ['brute', 'lsh'])
+def test_cached_recommendations_follow_updates(capsys, index):
+    cached = BookRecommendationSystem(sparse=True, index=index, cache_size=50)
+    fresh = BookRecommendationSystem(sparse=True, index=index)
+    data = _ratings(60, 40, 600, seed=4)
+    cached.load_data(data)
+    fresh.load_data(data)
+    rng = np.random.default_rng(5)
+    for step in range(100):
+        user = cached.user_labels[int(rng.integers(len(cached.user_labels)))]
+        got = cached.recommend_books(user, 3, show_details=bool(step % 2))
+        fresh._reset_caches()
+        assert got == fresh.recommend_books(user, 3, show_details=False)
+        if step % 3 == 0:
+            update = (f"u{rng.integers(60)}", f"b{rng.integers(40)}", float(rng.integers(6)))
+            cached.update_rating(*update)
+            fresh.update_rating(*update)
+    assert cached.cache_stats()['hits'] > 0
+
+
+@pytest.mark.parametrize("n_rows", [0, 1])
+def test_top_k_neighborhoods_without_other_rows(tmp_path, n_rows):
+    for path in (None, str(tmp_path)):
+        indices, similarities = top_k_neighborhoods(np.ones((n_rows, 3)), top_k=5, path=path)
+        assert indices.shape == similarities.shape == (n_rows, 0)
+
+
+def test_save_replaces_snapshot_despite_leftovers(tmp_path):
+    recommender = BookRecommendationSystem(sparse=True)
+    recommender.load_data(_ratings(20, 10, 100, seed=6))
+    path = tmp_path / 'snapshot'
+    recommender.save(str(path))
+    # Debris of a save that crashed mid-swap
+    for leftover in (f"snapshot.old-{os.getpid()}", f"snapshot.tmp-{os.getpid()}"):
+        (tmp_path / leftover).mkdir()
+        (tmp_path / leftover / 'meta.json').write_text('{}')
+    recommender.update_rating('u0', 'b0', 1.0)
+    recommender.save(str(path) + os.sep)
+
+    loaded = BookRecommendationSystem.load(str(path))
+    assert dict(loaded._rated_books('u0')) == dict(recommender._rated_books('u0'))
+    assert sorted(entry.name for entry in tmp_path.iterdir()) == [
+        'snapshot', f"snapshot.old-{os.getpid()}", f"snapshot.tmp-{os.getpid()}"
+    ]
+
+
+def test_overview_counts_rated_cells(capsys):
+    recommender = BookRecommendationSystem()
+    recommender.load_data({'user': ['a', 'a', 'b'], 'book': ['x', 'x', 'x'], 'rating': [2.0, 4.0, 5.0]})
+    recommender.display_dataset_overview()
+    output = capsys.readouterr().out
+    assert "Total ratings: 2" in output
+    assert "Average rating: 4.00" in output
+    assert "x (avg: 4.0, 2 ratings)" in output
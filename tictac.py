@@ -1,155 +1,1216 @@
-import math
-
-# Constants for the game
-AI = 1
-HUMAN = 2
-SIDE = 3
-AIMOVE = 'O'
-HUMANMOVE = 'X'
-
-# Function to initialise the game / Tic-Tac-Toe board
-def initialise():
-    board = [[' ' for _ in range(SIDE)] for _ in range(SIDE)]
-    return board
-
-# Function to print the Tic-Tac-Toe board
-def showBoard(board):
-    print("\n")
-    print("\t {} | {} | {} ".format(board[0][0], board[0][1], board[0][2]))
-    print("\t-----------")
-    print("\t {} | {} | {} ".format(board[1][0], board[1][1], board[1][2]))
-    print("\t-----------")
-    print("\t {} | {} | {} \n".format(board[2][0], board[2][1], board[2][2]))
-
-# Function to show the instructions
-def showInstructions():
-    print("\tTic-Tac-Toe\n")
-    print("Choose a cell numbered from 1 to 9 as below:\n")
-    print("\t 1 | 2 | 3 ")
-    print("\t-----------")
-    print("\t 4 | 5 | 6 ")
-    print("\t-----------")
-    print("\t 7 | 8 | 9 \n")
-
-# Check if there are moves left
-def isMovesLeft(board):
-    for row in board:
-        if ' ' in row:
-            return True
-    return False
-
-# Evaluate the board
-def evaluate(board):
-    # Rows
-    for row in range(SIDE):
-        if board[row][0] == board[row][1] == board[row][2]:
-            if board[row][0] == AIMOVE:
-                return +10
-            elif board[row][0] == HUMANMOVE:
-                return -10
-    # Columns
-    for col in range(SIDE):
-        if board[0][col] == board[1][col] == board[2][col]:
-            if board[0][col] == AIMOVE:
-                return +10
-            elif board[0][col] == HUMANMOVE:
-                return -10
-    # Diagonals
-    if board[0][0] == board[1][1] == board[2][2]:
-        if board[0][0] == AIMOVE:
-            return +10
-        elif board[0][0] == HUMANMOVE:
-            return -10
-    if board[0][2] == board[1][1] == board[2][0]:
-        if board[0][2] == AIMOVE:
-            return +10
-        elif board[0][2] == HUMANMOVE:
-            return -10
-    return 0
-
-# Minimax function
-def minimax(board, depth, isMax):
-    score = evaluate(board)
-
-    # If AI has won
-    if score == 10:
-        return score - depth  # prefer quicker win
-    # If Human has won
-    if score == -10:
-        return score + depth  # prefer slower loss
-    # If no moves left
-    if not isMovesLeft(board):
-        return 0
-
-    if isMax:
-        best = -math.inf
-        for i in range(SIDE):
-            for j in range(SIDE):
-                if board[i][j] == ' ':
-                    board[i][j] = AIMOVE
-                    best = max(best, minimax(board, depth + 1, not isMax))
-                    board[i][j] = ' '
-        return best
-    else:
-        best = math.inf
-        for i in range(SIDE):
-            for j in range(SIDE):
-                if board[i][j] == ' ':
-                    board[i][j] = HUMANMOVE
-                    best = min(best, minimax(board, depth + 1, not isMax))
-                    board[i][j] = ' '
-        return best
-
-# Find the best move for AI
-def findBestMove(board):
-    bestVal = -math.inf
-    bestMove = (-1, -1)
-
-    for i in range(SIDE):
-        for j in range(SIDE):
-            if board[i][j] == ' ':
-                board[i][j] = AIMOVE
-                moveVal = minimax(board, 0, False)
-                board[i][j] = ' '
-                if moveVal > bestVal:
-                    bestMove = (i, j)
-                    bestVal = moveVal
-    return bestMove
-
-# Play Tic-Tac-Toe
-def playTicTacToe():
-    board = initialise()
-    showInstructions()
-    showBoard(board)
-
-    while True:
-        # Human turn
-        humanMove = int(input("Enter your move (1-9): ")) - 1
-        x, y = humanMove // SIDE, humanMove % SIDE
-        if board[x][y] != ' ':
-            print("Invalid move! Try again.")
-            continue
-        board[x][y] = HUMANMOVE
-        showBoard(board)
-        if evaluate(board) == -10:
-            print("HUMAN wins!")
-            break
-        if not isMovesLeft(board):
-            print("It's a draw!")
-            break
-
-        # AI turn
-        print("AI is making a move...")
-        move = findBestMove(board)
-        board[move[0]][move[1]] = AIMOVE
-        showBoard(board)
-        if evaluate(board) == 10:
-            print("AI wins!")
-            break
-        if not isMovesLeft(board):
-            print("It's a draw!")
-            break
-
-# Driver function
-if __name__ == "__main__":
-    playTicTacToe()
+import argparse
+import json
+import math
+import multiprocessing
+import os
+import random
+import struct
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+
+# Constants for the game
+AI = 1
+HUMAN = 2
+SIDE = 3
+AIMOVE = 'O'
+HUMANMOVE = 'X'
+MAX_K = 5
+DEFAULT_TIME = 1.0
+
+# Default number in a row needed to win on a side x side board
+def defaultK(side):
+    return min(side, MAX_K)
+
+# All k-in-a-row windows as cell indexes on a flat board (index = row * side
+# + col): rows, then columns, then diagonals, then anti-diagonals
+@lru_cache(maxsize=None)
+def winLines(side, k):
+    lines = []
+    for dr, dc in ((0, 1), (1, 0), (1, 1), (1, -1)):
+        for r in range(side):
+            for c in range(side):
+                endR, endC = r + dr * (k - 1), c + dc * (k - 1)
+                if 0 <= endR < side and 0 <= endC < side:
+                    lines.append(tuple((r + dr * step) * side + c + dc * step for step in range(k)))
+    return tuple(lines)
+
+# Indexes into winLines(side, k) of the windows through each cell
+@lru_cache(maxsize=None)
+def linesThrough(side, k):
+    through = [[] for _ in range(side * side)]
+    for index, line in enumerate(winLines(side, k)):
+        for cell in line:
+            through[cell].append(index)
+    return tuple(tuple(indexes) for indexes in through)
+
+# Cells touching each cell, diagonals included
+@lru_cache(maxsize=None)
+def neighbourCells(side):
+    return tuple(
+        tuple((r + dr) * side + c + dc
+              for dr in (-1, 0, 1) for dc in (-1, 0, 1)
+              if (dr or dc) and 0 <= r + dr < side and 0 <= c + dc < side)
+        for r in range(side) for c in range(side)
+    )
+
+# Winning lines of the classic board, in the order evaluate checks them
+LINES = winLines(SIDE, SIDE)
+
+# Bitboards: one 9-bit int per player, bit i set when that player holds cell i
+FULL = (1 << (SIDE * SIDE)) - 1
+WIN_MASKS = tuple(sum(1 << cell for cell in line) for line in LINES)
+# IS_WIN[bits]: does a player holding these cells have a line?
+IS_WIN = tuple(any(bits & mask == mask for mask in WIN_MASKS) for bits in range(FULL + 1))
+
+# Search order: centre, corners, edges
+MOVE_ORDER = (4, 0, 2, 6, 8, 1, 3, 5, 7)
+MOVE_BITS = tuple(1 << cell for cell in MOVE_ORDER)
+
+# The 8 rotations/reflections of the board: SYMMETRIES[s][i] is where
+# cell i lands under symmetry s
+def boardSymmetries():
+    def rotate(cell):
+        return (cell % SIDE) * SIDE + (SIDE - 1 - cell // SIDE)
+
+    def reflect(cell):
+        return (cell // SIDE) * SIDE + (SIDE - 1 - cell % SIDE)
+
+    symmetries = []
+    for perm in (list(range(SIDE * SIDE)), [reflect(cell) for cell in range(SIDE * SIDE)]):
+        for _ in range(4):
+            symmetries.append(tuple(perm))
+            perm = [rotate(cell) for cell in perm]
+    return tuple(symmetries)
+
+SYMMETRIES = boardSymmetries()
+
+# SYMMETRY_TABLES[s][bits]: a bitboard mapped through symmetry s
+SYMMETRY_TABLES = tuple(
+    tuple(sum(1 << perm[cell] for cell in range(SIDE * SIDE) if bits >> cell & 1)
+          for bits in range(FULL + 1))
+    for perm in SYMMETRIES
+)
+
+# SYMMETRY_TABLES[s] undone: maps a bitboard from the canonical frame back
+INVERSE_TABLES = tuple(
+    tuple(sum(1 << cell for cell in range(SIDE * SIDE) if bits >> perm[cell] & 1)
+          for bits in range(FULL + 1))
+    for perm in SYMMETRIES
+)
+
+# Opening book file: header, then one record per canonical position
+BOOK_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "tictac.book")
+BOOK_MAGIC = b"TTTB"
+BOOK_VERSION = 1
+BOOK_HEADER = struct.Struct("<4sHI")  # magic, version, record count
+BOOK_RECORD = struct.Struct("<IHb")  # canonical key, best-move mask, best value
+
+# Transposition table bounds
+EXACT, LOWER, UPPER = 0, 1, 2
+
+# Boards at least this wide only consider cells next to a piece
+NEIGHBOURHOOD_SIDE = 7
+# Nodes between clock checks in the timed search
+CHECK_EVERY = 128
+# Entries kept per board size before a timed search starts a fresh table
+TABLE_LIMIT = 1 << 20
+# Plies the parallel search looks ahead on boards other than 3x3
+PARALLEL_DEPTH = 4
+# Below any value a search returns: "no alpha yet" in the shared bound
+NO_ALPHA = -(1 << 62)
+
+# canonical (mover, opponent) key -> (bound, value); values depend only on
+# the position, so the table stays valid across moves and games
+transpositionTable = {}
+
+# (side, k) -> {(Zobrist hash, player to move): (depth, bound, value, best
+# cell)} for the timed search on larger boards
+zobristTables = {}
+
+# Canonical key -> (best-move mask, best value) from BOOK_PATH, and the
+# (mtime, size) of the file it came from (None if there was no file), so a
+# book built or rebuilt later is picked up
+openingBook = {}
+openingBookSignature = None
+
+# Positions searched so far by minimax, negamax and the timed search
+searchNodes = 0
+
+# SearchStats while search instrumentation is on, None when it is off
+searchStats = None
+
+# In parallel search workers: the best root value proved so far by any
+# worker, a multiprocessing.Value set up by initParallelWorker
+sharedAlpha = None
+
+# Function to initialise the game / Tic-Tac-Toe board
+def initialise(side=SIDE):
+    board = [[' ' for _ in range(side)] for _ in range(side)]
+    return board
+
+# Width of one cell when drawing a side x side board
+def cellWidth(side):
+    return len(str(side * side))
+
+# Print rows of cells as a grid
+def showGrid(rows):
+    width = cellWidth(len(rows))
+    for i, row in enumerate(rows):
+        if i:
+            print("\t" + "-" * (len(row) * (width + 3) - 1))
+        line = "\t " + " | ".join(cell.center(width) for cell in row) + " "
+        print(line + "\n" if i == len(rows) - 1 else line)
+
+# Function to print the Tic-Tac-Toe board
+def showBoard(board):
+    print("\n")
+    showGrid(board)
+
+# Function to show the instructions
+def showInstructions(side=SIDE, k=None):
+    k = k or defaultK(side)
+    print("\tTic-Tac-Toe\n")
+    if (side, k) != (SIDE, SIDE):
+        print("Get {} in a row on a {}x{} board to win.".format(k, side, side))
+    print("Choose a cell numbered from 1 to {} as below:\n".format(side * side))
+    showGrid([[str(i * side + j + 1) for j in range(side)] for i in range(side)])
+
+# Check if there are moves left
+def isMovesLeft(board):
+    for row in board:
+        if ' ' in row:
+            return True
+    return False
+
+# Evaluate the board: +10 if AI has k in a row, -10 if HUMAN has
+def evaluate(board, k=None):
+    side = len(board)
+    if side == SIDE and k in (None, SIDE):
+        return evaluateBits(*toBitboard(board))
+    cells = [cell for row in board for cell in row]
+    for line in winLines(side, k or defaultK(side)):
+        first = cells[line[0]]
+        if first != ' ' and all(cells[cell] == first for cell in line):
+            return +10 if first == AIMOVE else -10
+    return 0
+
+# Convert a list-of-lists board to (AI bits, HUMAN bits)
+def toBitboard(board):
+    ai = human = 0
+    for i in range(SIDE):
+        for j in range(SIDE):
+            if board[i][j] == AIMOVE:
+                ai |= 1 << (i * SIDE + j)
+            elif board[i][j] == HUMANMOVE:
+                human |= 1 << (i * SIDE + j)
+    return ai, human
+
+# Convert (AI bits, HUMAN bits) back to a list-of-lists board
+def fromBitboard(ai, human):
+    return [[AIMOVE if ai >> (i * SIDE + j) & 1 else HUMANMOVE if human >> (i * SIDE + j) & 1 else ' '
+             for j in range(SIDE)] for i in range(SIDE)]
+
+# evaluate() on bitboards
+def evaluateBits(ai, human):
+    aiWins, humanWins = IS_WIN[ai], IS_WIN[human]
+    if aiWins and not humanWins:
+        return +10
+    if humanWins and not aiWins:
+        return -10
+    if aiWins:
+        # Both have a line (never in play): the first line found wins, as in evaluate
+        for mask in WIN_MASKS:
+            if ai & mask == mask:
+                return +10
+            if human & mask == mask:
+                return -10
+    return 0
+
+# Canonical key of a position: the smallest (mover, opponent) pair over
+# the 8 symmetries
+def canonicalKey(me, opp):
+    return min(table[me] << 9 | table[opp] for table in SYMMETRY_TABLES)
+
+# Counters for the findBestMove in progress, kept only while
+# instrumentation is on: the search checks searchStats is not None in the
+# branches it records, so turning it off leaves only that test
+class SearchStats:
+    def __init__(self):
+        self.last = None
+        self.begin([])
+
+    # Reset for a search from board
+    def begin(self, board):
+        self.rootPieces = sum(cell != ' ' for row in board for cell in row)
+        self.startNodes = searchNodes
+        self.startTime = time.perf_counter()
+        self.terminals = 0
+        self.leaves = 0
+        self.maxPly = 0
+        self.ttHits = 0
+        self.cutoffs = 0
+        self.rootMoves = []
+        self.iterations = []
+
+    # A won or drawn position ply moves below the root
+    def terminal(self, ply):
+        self.terminals += 1
+        if ply > self.maxPly:
+            self.maxPly = ply
+
+    # A position scored by the heuristic at the search horizon
+    def leaf(self, ply):
+        self.leaves += 1
+        if ply > self.maxPly:
+            self.maxPly = ply
+
+    def rootMove(self, move, value, seconds):
+        self.rootMoves.append({"move": list(move), "value": value, "ms": round(seconds * 1000, 3)})
+
+    # Finish the search: engine found move; the report is kept in last
+    def finish(self, engine, move):
+        seconds = time.perf_counter() - self.startTime
+        nodes = searchNodes - self.startNodes
+        self.last = {
+            "engine": engine,
+            "move": list(move),
+            "ms": round(seconds * 1000, 3),
+            "nodes": nodes,
+            "nodes_per_second": round(nodes / seconds) if seconds else 0,
+            "terminal_evaluations": self.terminals,
+            "horizon_evaluations": self.leaves,
+            "max_depth": self.maxPly,
+            "tt_hits": self.ttHits,
+            "tt_hit_rate": round(self.ttHits / nodes, 4) if nodes else 0.0,
+            "cutoffs": self.cutoffs,
+            "root_moves": self.rootMoves,
+            "iterations": self.iterations,
+        }
+        return self.last
+
+# Turn search instrumentation on or off
+def setInstrumentation(enabled=True):
+    global searchStats
+    searchStats = SearchStats() if enabled else None
+
+# Report on the last findBestMove (or findBestMoveMinimax /
+# findBestMoveParallel) call, or None if instrumentation is off
+def lastSearchReport():
+    return searchStats.last if searchStats is not None else None
+
+# Minimax function
+def minimax(board, depth, isMax):
+    global searchNodes
+    searchNodes += 1
+    score = evaluate(board)
+    if searchStats is not None and (score != 0 or not isMovesLeft(board)):
+        searchStats.terminal(depth + 1)
+
+    # If AI has won
+    if score == 10:
+        return score - depth  # prefer quicker win
+    # If Human has won
+    if score == -10:
+        return score + depth  # prefer slower loss
+    # If no moves left
+    if not isMovesLeft(board):
+        return 0
+
+    if isMax:
+        best = -math.inf
+        for i in range(SIDE):
+            for j in range(SIDE):
+                if board[i][j] == ' ':
+                    board[i][j] = AIMOVE
+                    best = max(best, minimax(board, depth + 1, not isMax))
+                    board[i][j] = ' '
+        return best
+    else:
+        best = math.inf
+        for i in range(SIDE):
+            for j in range(SIDE):
+                if board[i][j] == ' ':
+                    board[i][j] = HUMANMOVE
+                    best = min(best, minimax(board, depth + 1, not isMax))
+                    board[i][j] = ' '
+        return best
+
+# Find the best move for AI by plain minimax (reference for findBestMove)
+def findBestMoveMinimax(board):
+    stats = searchStats
+    if stats is not None:
+        stats.begin(board)
+    bestVal = -math.inf
+    bestMove = (-1, -1)
+
+    for i in range(SIDE):
+        for j in range(SIDE):
+            if board[i][j] == ' ':
+                start = time.perf_counter()
+                board[i][j] = AIMOVE
+                moveVal = minimax(board, 0, False)
+                board[i][j] = ' '
+                if stats is not None:
+                    stats.rootMove((i, j), moveVal, time.perf_counter() - start)
+                if moveVal > bestVal:
+                    bestMove = (i, j)
+                    bestVal = moveVal
+    if stats is not None:
+        stats.finish("minimax", bestMove)
+    return bestMove
+
+# Negamax with alpha-beta on bitboards: me is the player to move.
+# Scores are absolute: a win is worth 10 minus the pieces on the board
+# when it happens, so a position's value never depends on the path to it
+# and can be shared through the transposition table.
+def negamax(me, opp, pieces, alpha, beta):
+    global searchNodes
+    searchNodes += 1
+    key = canonicalKey(me, opp)
+    entry = transpositionTable.get(key)
+    if entry is not None:
+        if searchStats is not None:
+            searchStats.ttHits += 1
+        bound, value = entry
+        if bound == EXACT:
+            return value
+        if bound == LOWER:
+            alpha = max(alpha, value)
+        else:
+            beta = min(beta, value)
+        if alpha >= beta:
+            return value
+
+    alphaOrig = alpha
+    occupied = me | opp
+    best = -math.inf
+    for bit in MOVE_BITS:
+        if occupied & bit:
+            continue
+        if IS_WIN[me | bit] or occupied | bit == FULL:
+            value = 10 - (pieces + 1) if IS_WIN[me | bit] else 0
+            if searchStats is not None:
+                searchStats.terminal(pieces + 1 - searchStats.rootPieces)
+        else:
+            value = -negamax(opp, me | bit, pieces + 1, -beta, -alpha)
+
+        if value > best:
+            best = value
+            if best > alpha:
+                alpha = best
+                if alpha >= beta:
+                    if searchStats is not None:
+                        searchStats.cutoffs += 1
+                    break
+
+    if best <= alphaOrig:
+        transpositionTable[key] = (UPPER, best)
+    elif best >= beta:
+        transpositionTable[key] = (LOWER, best)
+    else:
+        transpositionTable[key] = (EXACT, best)
+    return best
+
+# Value of every empty cell for AI, exactly as minimax(board, 0, False)
+# would score it after AI plays there
+def scoreMoves(board):
+    ai, human = toBitboard(board)
+    pieces = bin(ai | human).count('1')
+    stats = searchStats
+
+    scores = {}
+    for cell in range(SIDE * SIDE):
+        bit = 1 << cell
+        if (ai | human) & bit:
+            continue
+        start = time.perf_counter()
+        score = evaluateBits(ai | bit, human)
+        if score != 0:
+            value = score
+        elif ai | human | bit == FULL:
+            value = 0
+        else:
+            value = -negamax(human, ai | bit, pieces + 1, -math.inf, math.inf)
+            # Absolute score -> minimax's depth-relative score
+            if value > 0:
+                value += pieces + 1
+            elif value < 0:
+                value -= pieces + 1
+        scores[(cell // SIDE, cell % SIDE)] = value
+        if stats is not None:
+            stats.rootMove((cell // SIDE, cell % SIDE), value, time.perf_counter() - start)
+    return scores
+
+# Canonical key of an AI-to-move position and the symmetry that gives it
+def bookKey(ai, human):
+    return min((table[ai] << 9 | table[human], s) for s, table in enumerate(SYMMETRY_TABLES))
+
+# Every reachable classic position with AI to move and the game not over,
+# whoever started, as (AI bits, HUMAN bits)
+def reachablePositions():
+    seen = set()
+    positions = []
+
+    def visit(ai, human, player):
+        if (ai, human, player) in seen:
+            return
+        seen.add((ai, human, player))
+        if IS_WIN[ai] or IS_WIN[human] or ai | human == FULL:
+            return
+        if player == AI:
+            positions.append((ai, human))
+        for cell in range(SIDE * SIDE):
+            bit = 1 << cell
+            if not (ai | human) & bit:
+                if player == AI:
+                    visit(ai | bit, human, HUMAN)
+                else:
+                    visit(ai, human | bit, AI)
+
+    visit(0, 0, AI)
+    visit(0, 0, HUMAN)
+    return positions
+
+# Solve every reachable position once and write the opening book: for each
+# canonical position, the mask of all moves with minimax's best value (so
+# the lookup can pick findBestMove's row-major choice in any orientation)
+def buildBook(path=BOOK_PATH):
+    book = {}
+    for ai, human in reachablePositions():
+        key, s = bookKey(ai, human)
+        if key in book:
+            continue
+        scores = scoreMoves(fromBitboard(ai, human))
+        bestVal = max(scores.values())
+        mask = sum(1 << (i * SIDE + j) for (i, j), value in scores.items() if value == bestVal)
+        book[key] = (SYMMETRY_TABLES[s][mask], bestVal)
+
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(BOOK_HEADER.pack(BOOK_MAGIC, BOOK_VERSION, len(book)))
+        for key in sorted(book):
+            f.write(BOOK_RECORD.pack(key, *book[key]))
+    os.replace(tmp, path)
+    return book
+
+# Read an opening book written by buildBook
+def loadBook(path=BOOK_PATH):
+    with open(path, "rb") as f:
+        data = f.read()
+    if len(data) < BOOK_HEADER.size:
+        raise ValueError("{}: not an opening book".format(path))
+    magic, version, count = BOOK_HEADER.unpack_from(data)
+    if magic != BOOK_MAGIC or version != BOOK_VERSION:
+        raise ValueError("{}: not a version {} opening book".format(path, BOOK_VERSION))
+    if len(data) != BOOK_HEADER.size + count * BOOK_RECORD.size:
+        raise ValueError("{}: truncated opening book".format(path))
+    return {key: (mask, value) for key, mask, value in BOOK_RECORD.iter_unpack(data[BOOK_HEADER.size:])}
+
+# The book at BOOK_PATH, reloaded when the file changes; empty when there
+# is no usable book, which is fine: findBestMove then searches
+def currentBook():
+    global openingBook, openingBookSignature
+    try:
+        stat = os.stat(BOOK_PATH)
+        signature = (stat.st_mtime_ns, stat.st_size)
+    except OSError:
+        signature = None
+    if signature != openingBookSignature:
+        try:
+            openingBook = loadBook() if signature is not None else {}
+        except (OSError, ValueError):
+            openingBook = {}
+        openingBookSignature = signature
+    return openingBook
+
+# Book move and value for a classic position, or None if it is not in the
+# book (or there is no book)
+def bookLookup(board, book=None):
+    if book is None:
+        book = currentBook()
+    ai, human = toBitboard(board)
+    key, s = bookKey(ai, human)
+    entry = book.get(key)
+    if entry is None:
+        return None
+    mask, bestVal = entry
+    mask = INVERSE_TABLES[s][mask]
+    cell = (mask & -mask).bit_length() - 1
+    return divmod(cell, SIDE), bestVal
+
+# Check every book entry against a fresh search; returns the positions
+# where they disagree
+def verifyBook(path=BOOK_PATH):
+    book = loadBook(path)
+    transpositionTable.clear()
+    bad = []
+    for ai, human in reachablePositions():
+        board = fromBitboard(ai, human)
+        scores = scoreMoves(board)
+        bestVal = max(scores.values())
+        expected = (min(move for move, value in scores.items() if value == bestVal), bestVal)
+        if bookLookup(board, book) != expected:
+            bad.append(board)
+    return bad
+
+# Find the best move for AI. The classic board is solved exactly, straight
+# from the opening book when there is one. Anything larger goes to the
+# timed search.
+def findBestMove(board, k=None, timeLimit=DEFAULT_TIME):
+    stats = searchStats
+    if stats is not None:
+        stats.begin(board)
+    if len(board) != SIDE or k not in (None, SIDE):
+        engine, move = "timed", searchBestMove(board, k, timeLimit)
+    else:
+        entry = bookLookup(board)
+        if entry is not None:
+            engine, move = "book", entry[0]
+        else:
+            engine, move = "exact", solveBestMove(board)
+    if stats is not None:
+        stats.finish(engine, move)
+    return move
+
+# Best classic move by search alone: the first cell, row by row, with the
+# best value
+def solveBestMove(board):
+    bestVal = -math.inf
+    bestMove = (-1, -1)
+    for move, moveVal in scoreMoves(board).items():
+        if moveVal > bestVal:
+            bestMove = move
+            bestVal = moveVal
+    return bestMove
+
+# Raised inside the timed search when the clock runs out
+class SearchTimeout(Exception):
+    pass
+
+# Random 64-bit keys per (player, cell), fixed per board size so hashes are
+# repeatable between runs
+@lru_cache(maxsize=None)
+def zobristKeys(side):
+    rng = random.Random(side)
+    return {player: tuple(rng.getrandbits(64) for _ in range(side * side)) for player in (AI, HUMAN)}
+
+# Board state for the timed search. Every window keeps a count of each
+# player's pieces, so playing a move updates the hash, the win test and
+# the heuristic score (from AI's side: windows only one player can still
+# complete are worth 10 ** (pieces - 1) to that player) by touching only
+# the windows through that cell.
+class Position:
+    def __init__(self, board, k):
+        self.side = len(board)
+        self.k = k
+        self.through = linesThrough(self.side, k)
+        self.neighbours = neighbourCells(self.side)
+        self.keys = zobristKeys(self.side)
+        self.weights = (0,) + tuple(10 ** (count - 1) for count in range(1, k + 1))
+        # Above any heuristic score, with room for the piece count
+        self.winScore = 4 * self.side * self.side * 10 ** k
+        self.cells = [0] * (self.side * self.side)
+        self.counts = {AI: [0] * len(winLines(self.side, k)), HUMAN: [0] * len(winLines(self.side, k))}
+        self.moves = []
+        self.score = 0
+        self.hash = 0
+        self.nodes = 0
+        self.deadline = math.inf
+        for i, row in enumerate(board):
+            for j, cell in enumerate(row):
+                if cell != ' ':
+                    self.play(i * self.side + j, AI if cell == AIMOVE else HUMAN)
+
+    # Put player's piece on cell; True if it completes k in a row
+    def play(self, cell, player):
+        own, other, weights = self.counts[player], self.counts[3 - player], self.weights
+        won = False
+        delta = 0
+        for line in self.through[cell]:
+            count = own[line] + 1
+            own[line] = count
+            if not other[line]:
+                delta += weights[count] - weights[count - 1]
+                won = won or count == self.k
+            elif count == 1:
+                delta += weights[other[line]]
+        self.score += delta if player == AI else -delta
+        self.hash ^= self.keys[player][cell]
+        self.cells[cell] = player
+        self.moves.append(cell)
+        return won
+
+    # Take back the last move, player's piece on cell
+    def undo(self, cell, player):
+        own, other, weights = self.counts[player], self.counts[3 - player], self.weights
+        delta = 0
+        for line in self.through[cell]:
+            count = own[line]
+            own[line] = count - 1
+            if not other[line]:
+                delta += weights[count] - weights[count - 1]
+            elif count == 1:
+                delta += weights[other[line]]
+        self.score -= delta if player == AI else -delta
+        self.hash ^= self.keys[player][cell]
+        self.cells[cell] = 0
+        self.moves.pop()
+
+    # Empty cells worth searching, most promising first: on wide boards
+    # only those next to a piece, ranked by the windows they extend or block
+    def candidates(self, player, first=None):
+        cells = self.cells
+        if not self.moves:
+            centre = (self.side // 2) * self.side + self.side // 2
+            return [centre]
+        if self.side < NEIGHBOURHOOD_SIDE:
+            moves = [cell for cell in range(len(cells)) if not cells[cell]]
+        else:
+            moves = list({near for cell in self.moves for near in self.neighbours[cell] if not cells[near]})
+
+        own, other, weights = self.counts[player], self.counts[3 - player], self.weights
+
+        def promise(cell):
+            value = 0
+            for line in self.through[cell]:
+                if not other[line]:
+                    value += weights[own[line] + 1]
+                if not own[line]:
+                    value += weights[other[line] + 1]
+            return value
+
+        moves.sort(key=lambda cell: (cell != first, -promise(cell), cell))
+        return moves
+
+# Depth-limited negamax with alpha-beta and a transposition table for
+# the player to move on pos. Raises SearchTimeout once pos.deadline passes.
+def searchNegamax(pos, table, player, depth, alpha, beta):
+    pos.nodes += 1
+    if pos.nodes % CHECK_EVERY == 0 and time.perf_counter() > pos.deadline:
+        raise SearchTimeout
+
+    key = (pos.hash, player)
+    entry = table.get(key)
+    first = None
+    if entry is not None:
+        if searchStats is not None:
+            searchStats.ttHits += 1
+        entryDepth, bound, value, first = entry
+        if entryDepth >= depth:
+            if bound == EXACT:
+                return value
+            if bound == LOWER:
+                alpha = max(alpha, value)
+            else:
+                beta = min(beta, value)
+            if alpha >= beta:
+                return value
+    if depth == 0:
+        if searchStats is not None:
+            searchStats.leaf(len(pos.moves) - searchStats.rootPieces)
+        return pos.score if player == AI else -pos.score
+
+    alphaOrig = alpha
+    best, bestCell = -math.inf, None
+    for cell in pos.candidates(player, first):
+        value = moveValue(pos, table, cell, player, depth, alpha, beta)
+        if value > best:
+            best, bestCell = value, cell
+            if best > alpha:
+                alpha = best
+                if alpha >= beta:
+                    if searchStats is not None:
+                        searchStats.cutoffs += 1
+                    break
+
+    if best <= alphaOrig:
+        bound = UPPER
+    elif best >= beta:
+        bound = LOWER
+    else:
+        bound = EXACT
+    table[key] = (depth, bound, best, bestCell)
+    return best
+
+# Value for player of playing cell on pos, searched depth plies deep
+# (this move included) within the window (alpha, beta)
+def moveValue(pos, table, cell, player, depth, alpha, beta):
+    won = pos.play(cell, player)
+    if won or len(pos.moves) == len(pos.cells):
+        # Win: sooner is better, as in the exact engine
+        value = pos.winScore - len(pos.moves) if won else 0
+        if searchStats is not None:
+            searchStats.terminal(len(pos.moves) - searchStats.rootPieces)
+    else:
+        value = -searchNegamax(pos, table, 3 - player, depth - 1, -beta, -alpha)
+    pos.undo(cell, player)
+    return value
+
+# Iterative-deepening alpha-beta for AI on any board: searches one ply
+# deeper each round until timeLimit seconds run out, and plays the best
+# move of the last finished round
+def searchBestMove(board, k=None, timeLimit=DEFAULT_TIME):
+    global searchNodes
+    side = len(board)
+    k = k or defaultK(side)
+    pos = Position(board, k)
+    size = side * side
+    table = zobristTables.setdefault((side, k), {})
+    if len(table) > TABLE_LIMIT:
+        table.clear()
+
+    moves = pos.candidates(AI)
+    if not moves:
+        return (-1, -1)
+    bestCell = moves[0]
+    stats = searchStats
+    start = time.perf_counter()
+    pos.deadline = start + timeLimit
+    for depth in range(1, size - len(pos.moves) + 1):
+        try:
+            value = searchNegamax(pos, table, AI, depth, -math.inf, math.inf)
+        except SearchTimeout:
+            break
+        bestCell = table[(pos.hash, AI)][3]
+        if stats is not None:
+            stats.iterations.append({"depth": depth, "move": list(divmod(bestCell, side)), "value": value,
+                                     "nodes": pos.nodes, "ms": round((time.perf_counter() - start) * 1000, 3)})
+        if abs(value) > pos.winScore - size:
+            break  # forced win or loss found: deeper search changes nothing
+    searchNodes += pos.nodes
+    return divmod(bestCell, side)
+
+def initParallelWorker(alpha):
+    global sharedAlpha
+    sharedAlpha = alpha
+
+# Value of AI playing cell, depth plies deep. Searching with the window
+# (alpha - 1, inf) means a move at least as good as alpha gets its exact
+# value while worse ones fail low, so ties are always settled by root
+# order, however the moves were scheduled.
+def rootMoveValue(board, k, depth, cell, alpha):
+    global searchNodes
+    low = -math.inf if alpha == NO_ALPHA else alpha - 1
+    pos = Position(board, k)
+    value = moveValue(pos, {}, cell, AI, depth, low, math.inf)
+    searchNodes += pos.nodes
+    return value
+
+# Process pool task: rootMoveValue against the shared alpha, then raise it.
+# Returns the value with the nodes and seconds it took.
+def parallelRootMove(board, k, depth, cell):
+    nodes = searchNodes
+    start = time.perf_counter()
+    value = rootMoveValue(board, k, depth, cell, sharedAlpha.value)
+    with sharedAlpha.get_lock():
+        if value > sharedAlpha.value:
+            sharedAlpha.value = value
+    return value, searchNodes - nodes, time.perf_counter() - start
+
+# Fixed-depth alpha-beta for AI with the root moves spread over a pool of
+# workers processes (in this process if workers is 0 or None). The move is
+# the same for any number of workers: the first, in candidate order, with
+# the best value. On 3x3 the default depth solves the game.
+def findBestMoveParallel(board, k=None, depth=None, workers=None):
+    global searchNodes
+    side = len(board)
+    k = k or defaultK(side)
+    pos = Position(board, k)
+    if depth is None:
+        depth = len(pos.cells) - len(pos.moves) if (side, k) == (SIDE, SIDE) else PARALLEL_DEPTH
+    moves = pos.candidates(AI)
+    stats = searchStats
+    if stats is not None:
+        stats.begin(board)
+
+    values = []
+    if not workers:
+        alpha = NO_ALPHA
+        for cell in moves:
+            start = time.perf_counter()
+            value = rootMoveValue(board, k, depth, cell, alpha)
+            values.append(value)
+            alpha = max(alpha, value)
+            if stats is not None:
+                stats.rootMove(divmod(cell, side), value, time.perf_counter() - start)
+    elif moves:
+        alpha = multiprocessing.Value("q", NO_ALPHA)
+        with ProcessPoolExecutor(workers, initializer=initParallelWorker, initargs=(alpha,)) as pool:
+            count = len(moves)
+            for cell, (value, nodes, seconds) in zip(moves, pool.map(
+                    parallelRootMove, [board] * count, [k] * count, [depth] * count, moves)):
+                values.append(value)
+                searchNodes += nodes
+                if stats is not None:
+                    stats.rootMove(divmod(cell, side), value, seconds)
+
+    move = divmod(moves[values.index(max(values))], side) if moves else (-1, -1)
+    if stats is not None:
+        stats.finish("parallel", move)
+    return move
+
+# A fixed middle-game position on a side x side board for benchmarks
+def benchmarkBoard(side):
+    board = initialise(side)
+    c = side // 2
+    board[c][c] = HUMANMOVE
+    if side > 1:
+        board[c - 1][c - 1] = AIMOVE
+    return board
+
+# Time findBestMoveParallel serially and with each worker count:
+# [(workers, seconds, move)], workers 0 being the serial path
+def benchmarkParallel(board, k=None, depth=None, workerCounts=(1, 2, 4, 8)):
+    results = []
+    for workers in (0,) + tuple(workerCounts):
+        start = time.perf_counter()
+        move = findBestMoveParallel(board, k, depth, workers)
+        results.append((workers, time.perf_counter() - start, move))
+    return results
+
+# The board as the other player sees it: X and O swapped, so engines that
+# always play AIMOVE can play either side
+def swapSides(board):
+    swap = {AIMOVE: HUMANMOVE, HUMANMOVE: AIMOVE, ' ': ' '}
+    return [[swap[cell] for cell in row] for row in board]
+
+# Empty cells, row by row
+def emptyCells(board):
+    return [(i, j) for i, row in enumerate(board) for j, cell in enumerate(row) if cell == ' ']
+
+# Players for playGame: called with the board (their own pieces as
+# AIMOVE) and k, they return the (row, col) to play
+
+def enginePlayer(timeLimit=DEFAULT_TIME):
+    return lambda board, k: findBestMove(board, k, timeLimit)
+
+# Plain minimax only knows the classic board
+def minimaxPlayer():
+    def play(board, k):
+        if len(board) != SIDE or k != SIDE:
+            raise ValueError("minimax only plays {0}x{0} boards with {0} in a row".format(SIDE))
+        return findBestMoveMinimax(board)
+    return play
+
+def randomPlayer(seed=None):
+    rng = random.Random(seed)
+    return lambda board, k: rng.choice(emptyCells(board))
+
+# Plays the first free cell of cells, numbered as in showInstructions;
+# once they are all taken, fallback decides
+def scriptedPlayer(cells, fallback=None):
+    script = tuple(cells)
+    fallback = fallback or randomPlayer(0)
+
+    def play(board, k):
+        side = len(board)
+        for cell in script:
+            i, j = divmod(cell - 1, side)
+            if 0 <= i < side and board[i][j] == ' ':
+                return i, j
+        return fallback(board, k)
+    return play
+
+# Whose turn it is: X moves first, as in playTicTacToe
+def pieceToMove(board):
+    cells = [cell for row in board for cell in row]
+    return HUMANMOVE if cells.count(HUMANMOVE) <= cells.count(AIMOVE) else AIMOVE
+
+# Play one game without any input or output, first moving next from board
+# (empty if None). Returns the winner (0 for first, 1 for second, None for
+# a draw), the moves, the final board and per-player move, time and node
+# totals.
+def playGame(first, second, board=None, k=None, side=SIDE):
+    board = [row[:] for row in board] if board is not None else initialise(side)
+    k = k or defaultK(len(board))
+    players = (first, second)
+    pieces = (pieceToMove(board), HUMANMOVE if pieceToMove(board) == AIMOVE else AIMOVE)
+    stats = [{"moves": 0, "seconds": 0.0, "maxSeconds": 0.0, "nodes": 0} for _ in players]
+    moves = []
+    turn = 0
+    while evaluate(board, k) == 0 and isMovesLeft(board):
+        view = board if pieces[turn] == AIMOVE else swapSides(board)
+        nodes = searchNodes
+        start = time.perf_counter()
+        i, j = players[turn](view, k)
+        seconds = time.perf_counter() - start
+        if board[i][j] != ' ':
+            raise ValueError("player {} chose taken cell {}".format(turn + 1, i * len(board) + j + 1))
+        board[i][j] = pieces[turn]
+        moves.append((i, j))
+        stat = stats[turn]
+        stat["moves"] += 1
+        stat["seconds"] += seconds
+        stat["maxSeconds"] = max(stat["maxSeconds"], seconds)
+        stat["nodes"] += searchNodes - nodes
+        turn = 1 - turn
+
+    score = evaluate(board, k)
+    winner = None if score == 0 else pieces.index(AIMOVE if score > 0 else HUMANMOVE)
+    return {"winner": winner, "moves": moves, "board": board, "players": stats}
+
+# Read positions, one per line: cells row by row as X, O and . (rows may be
+# split with /), blank lines and # comments ignored
+def readPositions(path):
+    positions = []
+    with open(path, encoding="utf-8") as f:
+        for number, line in enumerate(f, 1):
+            cells = line.split("#")[0].strip().replace("/", "")
+            if not cells:
+                continue
+            side = math.isqrt(len(cells))
+            if side * side != len(cells) or set(cells) - {HUMANMOVE, AIMOVE, "."}:
+                raise ValueError("{}:{}: not a square board of X, O and .".format(path, number))
+            positions.append([[" " if cell == "." else cell for cell in cells[i * side:(i + 1) * side]]
+                              for i in range(side)])
+    return positions
+
+# Summary of one player's move stats
+def moveReport(stats):
+    moves = sum(stat["moves"] for stat in stats)
+    seconds = sum(stat["seconds"] for stat in stats)
+    nodes = sum(stat["nodes"] for stat in stats)
+    return {
+        "moves": moves,
+        "nodes": nodes,
+        "nodes_per_second": round(nodes / seconds) if seconds else 0,
+        "ms_per_move": round(seconds / moves * 1000, 3) if moves else 0.0,
+        "max_ms_per_move": round(max((stat["maxSeconds"] for stat in stats), default=0.0) * 1000, 3),
+    }
+
+# Play games of findBestMove against opponent, taking turns to start. Each game starts
+# from the next of positions (the empty board if None), then randomPlies
+# random moves. Reports the engine's win/draw/loss rates and both sides'
+# search statistics.
+def selfPlay(games, opponent, side=SIDE, k=None, timeLimit=DEFAULT_TIME, positions=None,
+             randomPlies=0, seed=0):
+    engine = enginePlayer(timeLimit)
+    outcomes = {"win": 0, "draw": 0, "loss": 0}
+    engineStats, opponentStats = [], []
+    for game in range(games):
+        board = [row[:] for row in positions[game % len(positions)]] if positions else initialise(side)
+        gameK = k or defaultK(len(board))
+        rng = random.Random("{}:{}".format(seed, game))
+        for _ in range(randomPlies):
+            if evaluate(board, gameK) or not isMovesLeft(board):
+                break
+            i, j = rng.choice(emptyCells(board))
+            board[i][j] = pieceToMove(board)
+
+        engineFirst = game % 2 == 0
+        if engineFirst:
+            result = playGame(engine, opponent, board, gameK)
+        else:
+            result = playGame(opponent, engine, board, gameK)
+        engineIndex = 0 if engineFirst else 1
+        if result["winner"] is None:
+            outcomes["draw"] += 1
+        elif result["winner"] == engineIndex:
+            outcomes["win"] += 1
+        else:
+            outcomes["loss"] += 1
+        engineStats.append(result["players"][engineIndex])
+        opponentStats.append(result["players"][1 - engineIndex])
+
+    report = {"games": games}
+    report.update(outcomes)
+    report.update({name + "_rate": round(count / games, 4) if games else 0.0 for name, count in outcomes.items()})
+    report["engine"] = moveReport(engineStats)
+    report["opponent"] = moveReport(opponentStats)
+    return report
+
+# findBestMove on each position for whichever side is to move
+def analysePositions(positions, k=None, timeLimit=DEFAULT_TIME):
+    rows = []
+    for board in positions:
+        gameK = k or defaultK(len(board))
+        if evaluate(board, gameK) or not isMovesLeft(board):
+            rows.append({"board": "/".join("".join(row).replace(" ", ".") for row in board), "move": None})
+            continue
+        piece = pieceToMove(board)
+        nodes = searchNodes
+        start = time.perf_counter()
+        i, j = findBestMove(board if piece == AIMOVE else swapSides(board), gameK, timeLimit)
+        seconds = time.perf_counter() - start
+        rows.append({
+            "board": "/".join("".join(row).replace(" ", ".") for row in board),
+            "to_move": piece,
+            "move": i * len(board) + j + 1,
+            "nodes": searchNodes - nodes,
+            "ms": round(seconds * 1000, 3),
+        })
+        if lastSearchReport() is not None:
+            rows[-1]["search"] = lastSearchReport()
+    return rows
+
+# Fixed 3x3 benchmark positions (X to move on even piece counts, O on odd)
+SUITE = (
+    ".........", "X........", "....X....", ".X.......",
+    "X...O....", "X.......O", ".X..O....", "O...X....",
+    "X..O..X..", "XO..X....", "X.O.X....", "..X.O.X..",
+    "XOX.O....", "X..OX..O.", "O.X.X.O..", ".X.OX.O..",
+)
+
+# Time search against the plain minimax on SUITE, from a cold table and
+# without the opening book: [(position, engine, seconds, nodes, move)]
+def runSuite(repeat=1):
+    engines = (("search", solveBestMove), ("minimax", findBestMoveMinimax))
+    results = []
+    for cells in SUITE:
+        board = [[" " if cell == "." else cell for cell in cells[i * SIDE:(i + 1) * SIDE]] for i in range(SIDE)]
+        view = board if pieceToMove(board) == AIMOVE else swapSides(board)
+        for name, engine in engines:
+            best = math.inf
+            for _ in range(repeat):
+                transpositionTable.clear()
+                nodes = searchNodes
+                start = time.perf_counter()
+                move = engine(view)
+                best = min(best, time.perf_counter() - start)
+                nodes = searchNodes - nodes
+            results.append((cells, name, best, nodes, move))
+    return results
+
+# Play Tic-Tac-Toe
+def playTicTacToe(side=SIDE, k=None, timeLimit=DEFAULT_TIME, workers=None, depth=None):
+    k = k or defaultK(side)
+    board = initialise(side)
+    showInstructions(side, k)
+    showBoard(board)
+
+    while True:
+        # Human turn
+        try:
+            humanMove = int(input("Enter your move (1-{}): ".format(side * side))) - 1
+        except ValueError:
+            humanMove = -1
+        x, y = humanMove // side, humanMove % side
+        if not 0 <= humanMove < side * side or board[x][y] != ' ':
+            print("Invalid move! Try again.")
+            continue
+        board[x][y] = HUMANMOVE
+        showBoard(board)
+        if evaluate(board, k) == -10:
+            print("HUMAN wins!")
+            break
+        if not isMovesLeft(board):
+            print("It's a draw!")
+            break
+
+        # AI turn
+        print("AI is making a move...")
+        if workers:
+            move = findBestMoveParallel(board, k, depth, workers)
+        else:
+            move = findBestMove(board, k, timeLimit)
+        board[move[0]][move[1]] = AIMOVE
+        showBoard(board)
+        if lastSearchReport() is not None:
+            print(json.dumps(lastSearchReport()))
+        if evaluate(board, k) == 10:
+            print("AI wins!")
+            break
+        if not isMovesLeft(board):
+            print("It's a draw!")
+            break
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Tic-Tac-Toe against the computer")
+    parser.add_argument("--side", type=int, default=SIDE, help="board width and height")
+    parser.add_argument("--k", type=int, help="pieces in a row to win (default: min(side, {}))".format(MAX_K))
+    parser.add_argument("--time", type=float, default=DEFAULT_TIME,
+                        help="seconds the AI may think per move on boards other than 3x3")
+    parser.add_argument("--build-book", nargs="?", const=BOOK_PATH, metavar="PATH",
+                        help="solve every 3x3 position and write the opening book")
+    parser.add_argument("--verify-book", nargs="?", const=BOOK_PATH, metavar="PATH",
+                        help="check the opening book against a fresh search")
+    parser.add_argument("--workers", type=int, default=0,
+                        help="search the AI's moves to a fixed depth in this many processes")
+    parser.add_argument("--depth", type=int,
+                        help="plies for --workers and --benchmark (default: {} or solve 3x3)".format(PARALLEL_DEPTH))
+    parser.add_argument("--benchmark", action="store_true",
+                        help="time the parallel search with 1/2/4/8 workers against serial and exit")
+    parser.add_argument("--selfplay", type=int, metavar="GAMES",
+                        help="play GAMES headless games of the AI against --opponent and report")
+    parser.add_argument("--opponent", choices=("random", "engine", "minimax", "scripted"), default="random")
+    parser.add_argument("--script", default="",
+                        help="comma-separated cells the scripted opponent plays first, e.g. 5,1,9")
+    parser.add_argument("--positions", metavar="PATH",
+                        help="start positions for --selfplay, one per line as X/O/. cells")
+    parser.add_argument("--random-plies", type=int, default=0,
+                        help="random moves played from each start position before --selfplay games")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--analyse", metavar="PATH", help="report the AI's move for each position in PATH")
+    parser.add_argument("--suite", action="store_true",
+                        help="time the 3x3 search against minimax on a fixed position suite")
+    parser.add_argument("--repeat", type=int, default=1, help="runs per --suite position; the best counts")
+    parser.add_argument("--report", action="store_true",
+                        help="instrument the search and print a JSON report after each AI move")
+    args = parser.parse_args(argv)
+    setInstrumentation(args.report)
+
+    positions = None
+    try:
+        if args.analyse or args.positions:
+            positions = readPositions(args.analyse or args.positions)
+    except (OSError, ValueError) as exc:
+        parser.error(str(exc))
+
+    if args.build_book:
+        book = buildBook(args.build_book)
+        print("Wrote {} positions to {}".format(len(book), args.build_book))
+        return
+    if args.verify_book:
+        bad = verifyBook(args.verify_book)
+        print("{}: {} positions disagree with search".format(args.verify_book, len(bad)))
+        for board in bad[:10]:
+            showBoard(board)
+        raise SystemExit(1 if bad else 0)
+    if args.benchmark:
+        results = benchmarkParallel(benchmarkBoard(args.side), args.k, args.depth)
+        serial = results[0][1]
+        for workers, seconds, move in results:
+            print("{:>8} {:9.3f}s {:6.2f}x  move {}".format(
+                workers or "serial", seconds, serial / seconds, move))
+        if len({move for _, _, move in results}) != 1:
+            raise SystemExit("moves differ between worker counts")
+        return
+    if args.suite:
+        totals = {}
+        for cells, name, seconds, nodes, move in runSuite(args.repeat):
+            print("{} {:>8} {:10.3f}ms {:>9} nodes  move {}".format(cells, name, seconds * 1000, nodes, move))
+            total = totals.setdefault(name, [0.0, 0])
+            total[0] += seconds
+            total[1] += nodes
+        for name, (seconds, nodes) in totals.items():
+            print("{:>18} {:10.3f}ms {:>9} nodes  {:.2f}x".format(
+                name, seconds * 1000, nodes, totals["minimax"][0] / seconds))
+        return
+    if args.analyse:
+        print(json.dumps(analysePositions(positions, args.k, args.time), indent=2))
+        return
+    if args.selfplay:
+        sides = {len(board) for board in positions} if positions else {args.side}
+        if args.opponent == "minimax" and (sides != {SIDE} or args.k not in (None, SIDE)):
+            parser.error("--opponent minimax only plays {0}x{0} boards with {0} in a row".format(SIDE))
+        if args.opponent == "engine":
+            opponent = enginePlayer(args.time)
+        elif args.opponent == "minimax":
+            opponent = minimaxPlayer()
+        elif args.opponent == "scripted":
+            opponent = scriptedPlayer([int(cell) for cell in args.script.split(",") if cell.strip()],
+                                      randomPlayer(args.seed))
+        else:
+            opponent = randomPlayer(args.seed)
+        report = selfPlay(args.selfplay, opponent, args.side, args.k, args.time, positions,
+                          args.random_plies, args.seed)
+        print(json.dumps(report, indent=2))
+        return
+    if args.side < 1 or not 1 <= (args.k or defaultK(args.side)) <= args.side:
+        parser.error("need 1 <= k <= side")
+    playTicTacToe(args.side, args.k, args.time, args.workers, args.depth)
+
+# Driver function
+if __name__ == "__main__":
+    main()